@@ -1,44 +1,220 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
-from werkzeug.security import check_password_hash
+from werkzeug.security import generate_password_hash
 from werkzeug.utils import secure_filename
-from functools import wraps
+from functools import wraps, partial
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 import os
 import csv
+import hashlib
 import io
+import json
+import math
+import mimetypes
+import shutil
+import time
 from datetime import datetime
-from flask import Response, current_app
+from flask import Response, current_app, g
 
 from models.database import Database
 from utils.analytics import Analytics
+from utils.auth import check_password_cached
+from utils.cache import TTLCache
+from utils.images import optimize_cover, remove_cover, remove_upload
 
 admin = Blueprint('admin', __name__, url_prefix='/admin')
-db = Database()
-analytics = Analytics()
+
+@admin.record_once
+def init_extensions(state):
+    """Give the app its Database and Analytics unless it registered its own"""
+    if 'db' not in state.app.extensions:
+        state.app.extensions['db'] = Database()
+    if 'analytics' not in state.app.extensions:
+        state.app.extensions['analytics'] = Analytics()
+
+def _db():
+    return current_app.extensions['db']
+
+def _analytics():
+    return current_app.extensions['analytics']
+
+def clear_caches():
+    """Drop cached aggregates, catalog reads and the unread count after a committed write"""
+    _analytics().clear_cache()
+    _db().clear_catalog_cache()
+    _db().clear_notification_cache()
+
+# Independent dashboard aggregates run side by side; each opens its own
+# connection and sqlite3 releases the GIL while a statement executes.
+query_pool = ThreadPoolExecutor(max_workers=5, thread_name_prefix='admin-query')
+
+def run_concurrently(*calls):
+    """Run zero-argument callables on the query pool and return their results in order"""
+    futures = [query_pool.submit(call) for call in calls]
+    return [future.result() for future in futures]
+
+def _request_pool():
+    # Only POST and PUT views write, so every other request can use a read-only connection
+    return _db().reader if request.method in ('GET', 'HEAD') else _db().writer
+
+def get_db_conn():
+    """Return the connection for the current request, checking it out of the pool on first use"""
+    if 'db_conn' not in g:
+        g.db_conn = _request_pool().checkout()
+    return g.db_conn
+
+@admin.teardown_app_request
+def close_db_conn(exception=None):
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        _request_pool().checkin(conn)
+
+def wants_json():
+    """True when the client asked for JSON, as fetch() and XHR callers do"""
+    return (request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+            or request.accept_mimetypes.best == 'application/json')
 
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if 'admin_id' not in session:
+            if wants_json():
+                return jsonify({'success': False, 'error': 'Authentication required.'}), 401
             flash('Please log in to access the admin panel.', 'error')
             return redirect(url_for('admin.login'))
         return f(*args, **kwargs)
     return decorated_function
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 200
+ALLOWED_EXTENSIONS = frozenset({'png', 'jpg', 'jpeg', 'gif', 'webp'})
+_BAD_FLOAT_STRINGS = frozenset({'nan', 'inf', '-inf', 'infinity', '-infinity', '+inf', '+infinity'})
+
+def get_pagination():
+    """Read ?page=N&per_page=M from the query string, clamped to sane bounds"""
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', DEFAULT_PER_PAGE, type=int), 1), MAX_PER_PAGE)
+    return page, per_page
+
+def get_seek_cursor():
+    """Read ?after_created=...&after_id=N, the (created_at, id) of the last row already shown"""
+    after_created = request.args.get('after_created')
+    after_id = request.args.get('after_id', type=int)
+    if after_created is None or after_id is None:
+        return None, None
+    return after_created, after_id
+
+def split_seek_page(rows, per_page):
+    """Trim the extra lookahead row, returning the page and the cursor for the next one"""
+    if len(rows) <= per_page:
+        return rows, None
+    rows = rows[:per_page]
+    return rows, (rows[-1]['created_at'], rows[-1]['id'])
+
+def save_upload(stream, path):
+    """Copy an upload stream to disk in fixed-size chunks"""
+    try:
+        with open(path, 'wb') as out:
+            shutil.copyfileobj(stream, out, length=UPLOAD_CHUNK_SIZE)
+    except Exception:
+        remove_upload(path)
+        raise
+
+def store_cover(stream, path):
+    """Save an uploaded cover and convert it to the served sizes, returning the stored filename"""
+    save_upload(stream, path)
+    return optimize_cover(path)
+
 def allowed_file(filename):
-    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return os.path.splitext(filename)[1][1:].lower() in ALLOWED_EXTENSIONS
+
+class ValidationError(ValueError):
+    """A submitted book field failed validation"""
+    
+    def __init__(self, field, message):
+        super().__init__(message)
+        self.field = field
+        self.message = message
+
+@dataclass(slots=True)
+class BookForm:
+    title: str
+    author: str
+    description: str
+    price: float
+    stock: int
+    genre: str
+    stock_threshold: int
+
+def _parse_non_negative_int(value, field, label):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValidationError(field, f'{label} must be a valid integer.') from None
+    if number < 0:
+        raise ValidationError(field, f'{label} must be a non-negative integer.')
+    return number
+
+def _parse_book_form(form):
+    """Validate submitted book fields into a BookForm, raising ValidationError for the first bad one"""
+    title = str(form['title']).strip()
+    author = str(form['author']).strip()
+    if not title or not author:
+        raise ValidationError('title' if not title else 'author', 'Title and author are required.')
+    
+    # Reject NaN/inf spellings up front to prevent NaN injection
+    price_str = str(form['price']).strip()
+    if price_str.lower() in _BAD_FLOAT_STRINGS:
+        raise ValidationError('price', 'Invalid price value provided.')
+    try:
+        price = float(price_str)
+    except ValueError:
+        raise ValidationError('price', 'Price must be a valid number.') from None
+    if not math.isfinite(price):
+        raise ValidationError('price', 'Invalid price value provided.')
+    if price < 0:
+        raise ValidationError('price', 'Price must be a positive number.')
+    
+    return BookForm(title=title,
+                    author=author,
+                    description=str(form.get('description', '')),
+                    price=price,
+                    stock=_parse_non_negative_int(form['stock'], 'stock', 'Stock'),
+                    genre=str(form.get('genre', '')),
+                    stock_threshold=_parse_non_negative_int(form.get('stock_threshold', '5'), 'stock_threshold', 'Stock threshold'))
+
+# Unknown usernames are checked against this so a miss costs the same as a wrong password
+_DUMMY_PASSWORD_HASH = generate_password_hash('not-a-real-password')
+LOGIN_ATTEMPT_LIMIT = 10
+LOGIN_WINDOW_SECONDS = 60
+login_attempts = TTLCache(default_timeout=LOGIN_WINDOW_SECONDS)
+
+def login_rate_limited():
+    """Count a login attempt for this client and report whether it is over the limit"""
+    # Clients are told apart by remote_addr only. Behind a reverse proxy that is the
+    # proxy's address, so every client shares one limit unless the app is wrapped
+    # in werkzeug's ProxyFix for the number of proxies actually in front of it
+    # The counter expires LOGIN_WINDOW_SECONDS after its first attempt, and incr
+    # counts concurrent attempts from one address under the cache's lock
+    return login_attempts.incr(request.remote_addr) > LOGIN_ATTEMPT_LIMIT
 
 @admin.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
+        if login_rate_limited():
+            flash('Too many login attempts. Please try again in a minute.', 'error')
+            return render_template('admin/login.html'), 429
+        
         username = request.form['username']
         password = request.form['password']
         
-        conn = db.get_connection()
-        admin_user = conn.execute('SELECT * FROM admins WHERE username = ?', (username,)).fetchone()
-        conn.close()
+        conn = get_db_conn()
+        admin_user = conn.execute('SELECT id, username, password_hash, role FROM admins WHERE username = ?',
+                                  (username,)).fetchone()
         
-        if admin_user and check_password_hash(admin_user['password_hash'], password):
+        password_hash = admin_user['password_hash'] if admin_user else _DUMMY_PASSWORD_HASH
+        if check_password_cached(username, password_hash, password) and admin_user:
             session['admin_id'] = admin_user['id']
             session['admin_username'] = admin_user['username']
             session['admin_role'] = admin_user['role']
@@ -61,27 +237,18 @@ def logout():
 @admin.route('/dashboard')
 @login_required
 def dashboard():
-    stats = analytics.get_dashboard_stats()
-    top_books = analytics.get_top_selling_books(5)
-    low_stock = analytics.get_low_stock_alerts()
-    recent_orders = analytics.get_recent_orders(5)
-    unread_notifications = db.get_unread_notifications_count()
-    
-    return render_template('admin/dashboard.html', 
-                         stats=stats, 
-                         top_books=top_books,
-                         low_stock=low_stock,
-                         recent_orders=recent_orders,
-                         unread_notifications=unread_notifications)
+    # The page is a skeleton; each section loads from its /admin/api/ endpoint
+    return render_template('admin/dashboard.html')
 
 @admin.route('/analytics')
 @login_required
 def analytics_page():
-    stats = analytics.get_dashboard_stats()
-    top_books = analytics.get_top_selling_books(10)
-    genre_sales = analytics.get_sales_by_genre()
-    monthly_data = analytics.get_monthly_sales_data(12)
-    weekly_data = analytics.get_weekly_order_trends(12)
+    stats, top_books, genre_sales, monthly_data, weekly_data = run_concurrently(
+        _analytics().get_dashboard_stats,
+        partial(_analytics().get_top_selling_books, 10),
+        _analytics().get_sales_by_genre,
+        partial(_analytics().get_monthly_sales_data, 12),
+        partial(_analytics().get_weekly_order_trends, 12))
     
     return render_template('admin/analytics.html',
                          stats=stats,
@@ -93,228 +260,275 @@ def analytics_page():
 @admin.route('/notifications')
 @login_required
 def notifications():
-    notifications_list = db.get_recent_notifications(50)
+    notifications_list = _db().get_recent_notifications(50)
     return render_template('admin/notifications.html', notifications=notifications_list)
 
 @admin.route('/notifications/<int:notification_id>/read', methods=['POST'])
 @login_required
 def mark_notification_read(notification_id):
-    db.mark_notification_read(notification_id)
+    _db().mark_notification_read(notification_id)
     return jsonify({'success': True})
 
 @admin.route('/books')
 @login_required
 def books():
-    conn = db.get_connection()
-    books = conn.execute('SELECT * FROM books ORDER BY created_at DESC').fetchall()
-    conn.close()
-    return render_template('admin/books.html', books=books)
+    _, per_page = get_pagination()
+    after_created, after_id = get_seek_cursor()
+    conn = get_db_conn()
+    # Newest first, continuing after the last row of the previous page so deep pages
+    # are an index range scan rather than an OFFSET skip
+    seek = 'WHERE (created_at, id) < (?, ?)' if after_id is not None else ''
+    params = (after_created, after_id, per_page + 1) if after_id is not None else (per_page + 1,)
+    # Only the first 51 characters of the description are shown in the list
+    books = conn.execute(f'''
+        SELECT id, title, author, substr(description, 1, 51) as description, genre, price, stock,
+               image_filename, created_at
+        FROM books
+        {seek}
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+    ''', params).fetchall()
+    books, next_cursor = split_seek_page(books, per_page)
+    return render_template('admin/books.html', books=books, next_cursor=next_cursor)
 
 @admin.route('/books/add', methods=['GET', 'POST'])
 @login_required
 def add_book():
     if request.method == 'POST':
-        title = request.form['title']
-        author = request.form['author']
-        description = request.form.get('description', '')
-        # Validate price input to prevent NaN injection
-        price_str = request.form['price'].strip()
-        if price_str.lower() in ['nan', 'inf', '-inf', 'infinity', '-infinity']:
-            flash('Invalid price value provided.', 'error')
-            return render_template('admin/add_book.html')
-        try:
-            price = float(price_str)
-            if price < 0:
-                flash('Price must be a positive number.', 'error')
-                return render_template('admin/add_book.html')
-        except ValueError:
-            flash('Price must be a valid number.', 'error')
-            return render_template('admin/add_book.html')
-        # Validate stock input
-        try:
-            stock = int(request.form['stock'])
-            if stock < 0:
-                flash('Stock must be a non-negative integer.', 'error')
-                return render_template('admin/add_book.html')
-        except ValueError:
-            flash('Stock must be a valid integer.', 'error')
-            return render_template('admin/add_book.html')
-        genre = request.form.get('genre', '')
-        # Validate stock_threshold input
         try:
-            stock_threshold = int(request.form.get('stock_threshold', '5'))
-            if stock_threshold < 0:
-                flash('Stock threshold must be a non-negative integer.', 'error')
-                return render_template('admin/add_book.html')
-        except ValueError:
-            flash('Stock threshold must be a valid integer.', 'error')
+            form = _parse_book_form(request.form)
+        except ValidationError as e:
+            flash(e.message, 'error')
             return render_template('admin/add_book.html')
         
+        upload_folder = current_app.config['UPLOAD_FOLDER']
         image_filename = None
-        if 'image' in request.files:
-            file = request.files['image']
-            if file and file.filename and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                name, ext = os.path.splitext(filename)
-                image_filename = f"{name}_{int(datetime.now().timestamp())}{ext}"
-                file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], image_filename))
+        file = request.files.get('image')
+        if file and file.filename:
+            name, _, ext = secure_filename(file.filename).rpartition('.')
+            if name and ext.lower() in ALLOWED_EXTENSIONS:
+                # Saved and re-encoded before the transaction, so the write lock
+                # is never held while Pillow works
+                image_filename = store_cover(file.stream, os.path.join(upload_folder, f"{name}_{time.time_ns()}.{ext}"))
         
-        conn = db.get_connection()
-        conn.execute('''INSERT INTO books (title, author, description, price, stock, genre, image_filename, stock_threshold)
-                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
-                    (title, author, description, price, stock, genre, image_filename, stock_threshold))
-        conn.commit()
-        conn.close()
-        
-        # Add notification
-        db.add_notification('book_added', 'New Book Added', f'"{title}" by {author} has been added to the catalog.')
+        conn = get_db_conn()
+        # The book and its notification are committed together; a failed
+        # insert removes the cover stored for it
+        try:
+            with conn:
+                conn.execute('''INSERT INTO books (title, author, description, price, stock, genre, image_filename, stock_threshold)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                             (form.title, form.author, form.description, form.price, form.stock, form.genre,
+                              image_filename, form.stock_threshold))
+                _db().add_notification('book_added', 'New Book Added', f'"{form.title}" by {form.author} has been added to the catalog.', conn=conn)
+        except Exception:
+            if image_filename:
+                remove_cover(upload_folder, image_filename)
+            raise
+        clear_caches()
         
-        flash(f'Book "{title}" added successfully!', 'success')
+        flash(f'Book "{form.title}" added successfully!', 'success')
         return redirect(url_for('admin.books'))
     
     return render_template('admin/add_book.html')
 
+@admin.route('/books/bulk-add', methods=['POST'])
+@login_required
+def bulk_add_books():
+    """Insert a JSON array of books in a single transaction"""
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, list) or not payload:
+        return jsonify({'success': False, 'error': 'Expected a non-empty JSON array of books.'}), 400
+    
+    rows = []
+    for index, item in enumerate(payload):
+        try:
+            form = _parse_book_form(item)
+        except ValidationError as e:
+            return jsonify({'success': False, 'error': f'Invalid book at index {index}: {e.message}',
+                            'index': index, 'field': e.field}), 400
+        except (KeyError, TypeError, AttributeError):
+            return jsonify({'success': False, 'error': f'Invalid book at index {index}.'}), 400
+        rows.append((form.title, form.author, form.description, form.price, form.stock,
+                     form.genre, form.stock_threshold))
+    
+    conn = get_db_conn()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.executemany('''INSERT INTO books (title, author, description, price, stock, genre, stock_threshold)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)''', rows)
+        _db().add_notification('book_added', 'Books Imported', f'{len(rows)} books have been added to the catalog.', conn=conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    clear_caches()
+    
+    return jsonify({'success': True, 'added': len(rows)}), 201
+
 @admin.route('/books/<int:book_id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_book(book_id):
-    conn = db.get_connection()
-    book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
+    conn = get_db_conn()
+    if request.method == 'POST':
+        # The update only depends on these; the full row is read if the form is re-rendered
+        book = conn.execute('SELECT stock, image_filename FROM books WHERE id = ?', (book_id,)).fetchone()
+    else:
+        book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
     
     if book is None:
         flash('Book not found.', 'error')
         return redirect(url_for('admin.books'))
     
+    def render_form():
+        full_book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
+        return render_template('admin/edit_book.html', book=full_book)
+    
     if request.method == 'POST':
-        title = request.form['title']
-        author = request.form['author']
-        description = request.form.get('description', '')
-        # Validate price input to prevent NaN injection
-        price_str = request.form['price'].strip()
-        if price_str.lower() in ['nan', 'inf', '-inf', 'infinity', '-infinity']:
-            flash('Invalid price value provided.', 'error')
-            return render_template('admin/edit_book.html', book=book)
-        try:
-            price = float(price_str)
-            if price < 0:
-                flash('Price must be a positive number.', 'error')
-                return render_template('admin/edit_book.html', book=book)
-        except ValueError:
-            flash('Price must be a valid number.', 'error')
-            return render_template('admin/edit_book.html', book=book)
-        # Validate stock input
         try:
-            stock = int(request.form['stock'])
-            if stock < 0:
-                flash('Stock must be a non-negative integer.', 'error')
-                return render_template('admin/edit_book.html', book=book)
-        except ValueError:
-            flash('Stock must be a valid integer.', 'error')
-            return render_template('admin/edit_book.html', book=book)
-        genre = request.form.get('genre', '')
-        # Validate stock_threshold input
-        try:
-            stock_threshold = int(request.form.get('stock_threshold', '5'))
-            if stock_threshold < 0:
-                flash('Stock threshold must be a non-negative integer.', 'error')
-                return render_template('admin/edit_book.html', book=book)
-        except ValueError:
-            flash('Stock threshold must be a valid integer.', 'error')
-            return render_template('admin/edit_book.html', book=book)
+            form = _parse_book_form(request.form)
+        except ValidationError as e:
+            flash(e.message, 'error')
+            return render_form()
         
-        image_filename = book['image_filename']
-        if 'image' in request.files:
-            file = request.files['image']
-            if file and file.filename and allowed_file(file.filename):
-                # Delete old image if exists
-                if image_filename:
-                    old_path = os.path.join(current_app.config['UPLOAD_FOLDER'], image_filename)
-                    if os.path.exists(old_path):
-                        os.remove(old_path)
-                
-                filename = secure_filename(file.filename)
-                name, ext = os.path.splitext(filename)
-                image_filename = f"{name}_{int(datetime.now().timestamp())}{ext}"
-                file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], image_filename))
+        upload_folder = current_app.config['UPLOAD_FOLDER']
+        new_image = None
+        file = request.files.get('image')
+        if file and file.filename:
+            name, _, ext = secure_filename(file.filename).rpartition('.')
+            if name and ext.lower() in ALLOWED_EXTENSIONS:
+                # Saved and re-encoded before the transaction, so the write lock
+                # is never held while Pillow works
+                new_image = store_cover(file.stream, os.path.join(upload_folder, f"{name}_{time.time_ns()}.{ext}"))
         
-        # Check for low stock alert
-        old_stock = book['stock']
-        if stock <= stock_threshold and old_stock > stock_threshold:
-            db.add_notification('low_stock', 'Low Stock Alert', f'"{title}" is now low on stock ({stock} remaining).')
+        try:
+            with conn:
+                conn.execute('''UPDATE books SET title=?, author=?, description=?, price=?, stock=?, genre=?, image_filename=?, stock_threshold=?, updated_at=CURRENT_TIMESTAMP
+                               WHERE id=?''',
+                            (form.title, form.author, form.description, form.price, form.stock, form.genre,
+                             new_image or book['image_filename'], form.stock_threshold, book_id))
+                
+                # Check for low stock alert
+                if form.stock <= form.stock_threshold and book['stock'] > form.stock_threshold:
+                    _db().add_notification('low_stock', 'Low Stock Alert', f'"{form.title}" is now low on stock ({form.stock} remaining).', conn=conn)
+        except Exception:
+            if new_image:
+                remove_cover(upload_folder, new_image)
+            raise
+        clear_caches()
         
-        conn.execute('''UPDATE books SET title=?, author=?, description=?, price=?, stock=?, genre=?, image_filename=?, stock_threshold=?, updated_at=CURRENT_TIMESTAMP
-                       WHERE id=?''',
-                    (title, author, description, price, stock, genre, image_filename, stock_threshold, book_id))
-        conn.commit()
-        conn.close()
+        # The old image is only dropped once the new one is committed
+        if new_image and book['image_filename']:
+            current_app.io_pool.submit(remove_cover, upload_folder, book['image_filename'])
         
-        flash(f'Book "{title}" updated successfully!', 'success')
+        flash(f'Book "{form.title}" updated successfully!', 'success')
         return redirect(url_for('admin.books'))
     
-    conn.close()
     return render_template('admin/edit_book.html', book=book)
 
 @admin.route('/books/<int:book_id>/delete', methods=['POST'])
 @login_required
 def delete_book(book_id):
-    conn = db.get_connection()
-    book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
+    conn = get_db_conn()
+    with conn:
+        book = conn.execute('DELETE FROM books WHERE id = ? RETURNING title, image_filename', (book_id,)).fetchone()
+        if book:
+            _db().add_notification('book_deleted', 'Book Deleted', f'"{book["title"]}" has been removed from the catalog.', conn=conn)
     
     if book:
+        clear_caches()
+        
         # Delete image file if exists
         if book['image_filename']:
-            image_path = os.path.join(current_app.config['UPLOAD_FOLDER'], book['image_filename'])
-            if os.path.exists(image_path):
-                os.remove(image_path)
-        
-        conn.execute('DELETE FROM books WHERE id = ?', (book_id,))
-        conn.commit()
-        
-        # Add notification
-        db.add_notification('book_deleted', 'Book Deleted', f'"{book["title"]}" has been removed from the catalog.')
-        
+            current_app.io_pool.submit(remove_cover, current_app.config['UPLOAD_FOLDER'], book['image_filename'])
+    
+    # AJAX callers get the outcome directly instead of a flash stored in the session
+    if wants_json():
+        if book is None:
+            return jsonify({'success': False, 'error': 'Book not found.'}), 404
+        return jsonify({'success': True})
+    
+    if book:
         flash(f'Book "{book["title"]}" deleted successfully!', 'success')
     else:
         flash('Book not found.', 'error')
     
-    conn.close()
     return redirect(url_for('admin.books'))
 
+@admin.route('/books/<int:book_id>/image', methods=['PUT'])
+@login_required
+def upload_book_image(book_id):
+    """Replace a book's cover image with the raw request body"""
+    ext = mimetypes.guess_extension(request.mimetype or '')
+    if not ext or not allowed_file(f'cover{ext}'):
+        return jsonify({'success': False, 'error': 'Unsupported image type.'}), 415
+    
+    conn = get_db_conn()
+    book = conn.execute('SELECT image_filename FROM books WHERE id = ?', (book_id,)).fetchone()
+    if book is None:
+        return jsonify({'success': False, 'error': 'Book not found.'}), 404
+    
+    image_filename = store_cover(request.stream,
+                                 os.path.join(current_app.config['UPLOAD_FOLDER'], f"book_{book_id}_{time.time_ns()}{ext}"))
+    
+    try:
+        with conn:
+            conn.execute('UPDATE books SET image_filename = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                         (image_filename, book_id))
+    except Exception:
+        remove_cover(current_app.config['UPLOAD_FOLDER'], image_filename)
+        raise
+    clear_caches()
+    
+    if book['image_filename']:
+        current_app.io_pool.submit(remove_cover, current_app.config['UPLOAD_FOLDER'], book['image_filename'])
+    
+    return jsonify({'success': True, 'image_filename': image_filename})
+
 @admin.route('/inventory')
 @login_required
 def inventory():
-    conn = db.get_connection()
-    books = conn.execute('SELECT * FROM books ORDER BY stock ASC, title').fetchall()
-    low_stock = analytics.get_low_stock_alerts()
-    out_of_stock = analytics.get_out_of_stock_books()
-    conn.close()
+    page, per_page = get_pagination()
+    conn = get_db_conn()
+    counts = conn.execute('SELECT COUNT(*) as total, COALESCE(SUM(stock > 0), 0) as in_stock FROM books').fetchone()
+    books = conn.execute('''
+        SELECT id, title, author, description, genre, price, stock, stock_threshold, image_filename
+        FROM books
+        ORDER BY stock ASC, title, id
+        LIMIT ? OFFSET ?
+    ''', (per_page, (page - 1) * per_page)).fetchall()
+    low_stock = _analytics().get_low_stock_alerts()
+    out_of_stock = _analytics().get_out_of_stock_books()
     
     return render_template('admin/inventory.html', 
                          books=books, 
                          low_stock=low_stock,
-                         out_of_stock=out_of_stock)
+                         out_of_stock=out_of_stock,
+                         total_books=counts['total'],
+                         in_stock_count=counts['in_stock'],
+                         page=page,
+                         pages=max(1, -(-counts['total'] // per_page)))
 
 @admin.route('/inventory/export')
 @login_required
 def export_inventory():
-    export_data = analytics.export_analytics_data()
-    books = export_data['books']
-    
-    output = []
-    output.append(['ID', 'Title', 'Author', 'Genre', 'Price', 'Stock', 'Stock Threshold', 'Total Sold', 'Total Revenue'])
+    # Resolved here because the generator runs after the app context is gone
+    batches = _analytics().iter_books_export()
     
-    for book in books:
-        output.append([
-            book['id'], book['title'], book['author'], book['genre'] or '',
-            book['price'], book['stock'], book.get('stock_threshold', 5),
-            book['total_sold'], round(book['total_revenue'], 2)
-        ])
-    
-    csv_output = io.StringIO()
-    csv_writer = csv.writer(csv_output)
-    csv_writer.writerows(output)
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['ID', 'Title', 'Author', 'Genre', 'Price', 'Stock', 'Stock Threshold', 'Total Sold', 'Total Revenue'])
+        for batch in batches:
+            # Columns arrive in header order; csv writes a missing genre as an empty field
+            writer.writerows((*book[:-1], round(book[-1], 2)) for book in batch)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
     
     return Response(
-        csv_output.getvalue(),
+        generate(),
         mimetype="text/csv",
         headers={"Content-disposition": f"attachment; filename=inventory_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"}
     )
@@ -322,23 +536,25 @@ def export_inventory():
 @admin.route('/orders')
 @login_required
 def orders():
-    conn = db.get_connection()
+    conn = get_db_conn()
     orders = conn.execute('''
-        SELECT o.*, COUNT(oi.id) as item_count,
-               GROUP_CONCAT(b.title, ' | ') as book_titles
+        SELECT o.*, COALESCE(x.item_count, 0) as item_count, x.book_titles
         FROM orders o
-        LEFT JOIN order_items oi ON o.order_id = oi.order_id
-        LEFT JOIN books b ON oi.book_id = b.id
-        GROUP BY o.id
+        LEFT JOIN (
+            SELECT oi.order_id, COUNT(oi.id) as item_count,
+                   GROUP_CONCAT(b.title, ' | ') as book_titles
+            FROM order_items oi
+            LEFT JOIN books b ON oi.book_id = b.id
+            GROUP BY oi.order_id
+        ) x ON x.order_id = o.order_id
         ORDER BY o.created_at DESC
     ''').fetchall()
-    conn.close()
     return render_template('admin/orders.html', orders=orders)
 
 @admin.route('/orders/<order_id>')
 @login_required
 def order_detail(order_id):
-    conn = db.get_connection()
+    conn = get_db_conn()
     
     order = conn.execute('SELECT * FROM orders WHERE order_id = ?', (order_id,)).fetchone()
     if not order:
@@ -352,7 +568,6 @@ def order_detail(order_id):
         WHERE oi.order_id = ?
     ''', (order_id,)).fetchall()
     
-    conn.close()
     return render_template('admin/order_detail.html', order=order, order_items=order_items)
 
 @admin.route('/orders/<order_id>/update-status', methods=['POST'])
@@ -360,32 +575,99 @@ def order_detail(order_id):
 def update_order_status(order_id):
     new_status = request.form.get('status')
     
-    conn = db.get_connection()
-    conn.execute('UPDATE orders SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE order_id = ?', 
-                (new_status, order_id))
-    conn.commit()
+    conn = get_db_conn()
+    with conn:
+        updated = conn.execute('''UPDATE orders SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE order_id = ?
+                                  RETURNING order_id''', (new_status, order_id)).fetchone()
+        if updated is not None:
+            _db().add_notification('order_updated', 'Order Status Updated', f'Order {order_id} status changed to {new_status.title()}.', conn=conn)
+    
+    if updated is not None:
+        clear_caches()
     
-    # Add notification
-    db.add_notification('order_updated', 'Order Status Updated', f'Order {order_id} status changed to {new_status.title()}.')
+    if wants_json():
+        if updated is None:
+            return jsonify({'success': False, 'error': 'Order not found.'}), 404
+        return jsonify({'success': True, 'status': new_status})
+    
+    if updated is None:
+        flash('Order not found.', 'error')
+        return redirect(url_for('admin.orders'))
     
-    conn.close()
     flash(f'Order {order_id} status updated to {new_status.title()}!', 'success')
     return redirect(url_for('admin.orders'))
 
+# Serialized chart payloads, each paired with the result list it was built from
+_json_bodies = {}
+
+def rows_json_response(name, rows):
+    """Return rows as a JSON array of objects, reusing the bytes while the cached rows are unchanged"""
+    cached = _json_bodies.get(name)
+    if cached is None or cached[0] is not rows:
+        keys = rows[0].keys() if rows else []
+        body = json.dumps([dict(zip(keys, row)) for row in rows], separators=(',', ':')).encode()
+        cached = _json_bodies[name] = (rows, body)
+    return current_app.response_class(cached[1], mimetype='application/json')
+
+# The data version this process's in-memory caches were last checked against; each
+# worker has its own caches, so each tracks the version it has caught up with
+_seen_data_version = None
+
+def data_version():
+    """The trigger-maintained write counter behind the dashboard aggregates, plus the current date"""
+    global _seen_data_version
+    version = tuple(get_db_conn().execute("SELECT version, date('now') FROM data_version WHERE id = 1").fetchone())
+    # Writes made outside the admin views (e.g. the storefront or another worker) don't
+    # clear this process's aggregate cache themselves, so a changed version does it here
+    if version != _seen_data_version:
+        if _seen_data_version is not None:
+            clear_caches()
+        _seen_data_version = version
+    return version
+
+def conditional_json(name, build):
+    """Serve build()'s JSON with an ETag, answering 304 while the underlying data is unchanged"""
+    etag = hashlib.md5(f'{name}:{data_version()}'.encode(), usedforsecurity=False).hexdigest()
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@admin.route('/api/stats')
+@login_required
+def api_dashboard_stats():
+    return conditional_json('stats', _analytics().get_dashboard_stats)
+
+@admin.route('/api/top-books')
+@login_required
+def api_top_books():
+    return conditional_json('top-books', lambda: [dict(row) for row in _analytics().get_top_selling_books(5)])
+
+@admin.route('/api/low-stock')
+@login_required
+def api_low_stock():
+    return conditional_json('low-stock', lambda: [dict(row) for row in _analytics().get_low_stock_alerts()])
+
+@admin.route('/api/recent-orders')
+@login_required
+def api_recent_orders():
+    return conditional_json('recent-orders', lambda: [dict(row) for row in _analytics().get_recent_orders(5)])
+
 @admin.route('/api/notifications/unread-count')
 @login_required
 def api_unread_notifications_count():
-    count = db.get_unread_notifications_count()
+    count = _db().get_unread_notifications_count()
     return jsonify({'count': count})
 
 @admin.route('/api/chart-data/monthly-sales')
 @login_required
 def api_monthly_sales_data():
-    data = analytics.get_monthly_sales_data(12)
-    return jsonify([dict(row) for row in data])
+    return rows_json_response('monthly-sales', _analytics().get_monthly_sales_data(12))
 
 @admin.route('/api/chart-data/genre-sales')
 @login_required
 def api_genre_sales_data():
-    data = analytics.get_sales_by_genre()
-    return jsonify([dict(row) for row in data])
\ No newline at end of file
+    return rows_json_response('genre-sales', _analytics().get_sales_by_genre())
\ No newline at end of file
@@ -1,26 +1,59 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, g, Response, stream_with_context, send_from_directory
+from werkzeug.security import generate_password_hash
 from werkzeug.utils import secure_filename
 import sqlite3
 import os
+import io
 import csv
 from datetime import datetime
 from functools import wraps
 import uuid
 
+from models.database import configure_connection, create_books_fts, fts_match_query
+from utils.auth import check_password_cached
+from utils.cache import TTLCache, cache
+from utils.images import optimize_cover, remove_cover, thumbnail_name
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-change-in-production'
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
+PAGE_SIZE = 24
+# The home page shows this many books, and links to search when there are more
+HOME_FEATURED_BOOKS = 8
+COVER_MAX_AGE = 365 * 24 * 60 * 60
+BOOK_CACHE_TIMEOUT = 30
+
+# Statements on the hot storefront paths; keeping each one as a single string means
+# sqlite3's per-connection statement cache reuses the compiled program instead of re-preparing it
+# List pages select only the columns their templates render
+SQL_HOME_BOOKS = ('SELECT id, title, author, genre, price, stock, image_filename FROM books WHERE stock > 0 '
+                  'ORDER BY created_at DESC LIMIT ?')
+SQL_BOOK_BY_ID = 'SELECT * FROM books WHERE id = ?'
+SQL_BOOKS_BY_IDS = 'SELECT id, title, author, price, stock, image_filename FROM books WHERE id IN ({})'
+SQL_FULL_BOOKS_BY_IDS = 'SELECT * FROM books WHERE id IN ({})'
+SQL_INSERT_ORDER = '''INSERT INTO orders (order_id, customer_name, customer_email, total_amount)
+                      VALUES (?, ?, ?, ?)'''
+SQL_INSERT_ORDER_ITEM = '''INSERT INTO order_items (order_id, book_id, quantity, price)
+                           VALUES (?, ?, ?, ?)'''
+# Only decrements when enough stock is left, so a short row shows up in the rowcount
+SQL_DECREMENT_STOCK = 'UPDATE books SET stock = stock - ? WHERE id = ? AND stock >= ?'
+
 # Ensure upload directory exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+# List pages show the small WebP rendition of a cover
+app.add_template_filter(thumbnail_name, 'thumbnail')
+
 # Database setup
 def init_db():
     conn = sqlite3.connect('bookstore.db')
     c = conn.cursor()
     
+    # WAL is persistent, so setting it once lets readers run alongside writers
+    c.execute('PRAGMA journal_mode=WAL')
+    
     # Books table
     c.execute('''CREATE TABLE IF NOT EXISTS books (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -63,6 +96,17 @@ def init_db():
                     FOREIGN KEY (book_id) REFERENCES books (id)
                 )''')
     
+    # Indexes for the storefront filters and admin listings; names match
+    # models/database.py since both apps share bookstore.db
+    # Ascending (created_at, id) so the newest-first keyset listing is one backward range scan
+    c.execute('CREATE INDEX IF NOT EXISTS idx_books_created_id ON books(created_at, id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_books_genre ON books(genre)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_books_author ON books(author)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_oi_order ON order_items(order_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_orders_created ON orders(created_at DESC)')
+    
+    create_books_fts(c)
+    
     # Create default admin if doesn't exist
     c.execute('SELECT COUNT(*) FROM admins')
     if c.fetchone()[0] == 0:
@@ -84,9 +128,8 @@ def init_db():
             ('Cooking Fundamentals', 'Chef Maria Lopez', 'Learn the basics of cooking with step-by-step instructions and recipes.', 24.99, 20, 'Non-Fiction')
         ]
         
-        for book in sample_books:
-            c.execute('''INSERT INTO books (title, author, description, price, stock, genre)
-                        VALUES (?, ?, ?, ?, ?, ?)''', book)
+        c.executemany('''INSERT INTO books (title, author, description, price, stock, genre)
+                         VALUES (?, ?, ?, ?, ?, ?)''', sample_books)
     
     conn.commit()
     conn.close()
@@ -103,31 +146,126 @@ def login_required(f):
 
 # Helper functions
 def get_db_connection():
-    conn = sqlite3.connect('bookstore.db')
-    conn.row_factory = sqlite3.Row
+    """Return the connection for the current request, opening it on first use"""
+    conn = g.get('_db')
+    if conn is None:
+        conn = g._db = configure_connection(sqlite3.connect('bookstore.db'))
+        conn.row_factory = sqlite3.Row
     return conn
 
+@app.teardown_appcontext
+def close_db_connection(exception=None):
+    conn = g.pop('_db', None)
+    if conn is not None:
+        conn.close()
+
+# Catalog reads only change when an admin edits books or a checkout moves stock,
+# so they are cached briefly and dropped by clear_catalog_cache() on those writes
+@cache.memoize(timeout=60)
+def get_home_books():
+    # One extra row tells the template there are more books to link to
+    return get_db_connection().execute(SQL_HOME_BOOKS, (HOME_FEATURED_BOOKS + 1,)).fetchall()
+
+@cache.memoize(timeout=300)
+def get_filter_options():
+    conn = get_db_connection()
+    genres = conn.execute('SELECT DISTINCT genre FROM books WHERE genre IS NOT NULL').fetchall()
+    authors = conn.execute('SELECT DISTINCT author FROM books').fetchall()
+    return genres, authors
+
+@cache.memoize(timeout=30)
+def get_dashboard_stats():
+    conn = get_db_connection()
+    # One pass over books for all three book aggregates; the half-open range
+    # on created_at lets the order count use idx_orders_created
+    books = conn.execute('''SELECT COUNT(*) as total_books,
+                                   COALESCE(SUM(stock), 0) as total_stock,
+                                   COALESCE(SUM(stock < 5), 0) as low_stock_books
+                            FROM books''').fetchone()
+    recent_orders = conn.execute("SELECT COUNT(*) FROM orders WHERE created_at >= date('now')").fetchone()[0]
+    
+    return {
+        'total_books': books['total_books'],
+        'total_stock': books['total_stock'],
+        'low_stock_books': books['low_stock_books'],
+        'recent_orders': recent_orders
+    }
+
+def clear_catalog_cache():
+    for f in (get_home_books, get_filter_options, get_dashboard_stats):
+        cache.delete_memoized(f)
+
+# Full book rows by id for the storefront's display reads; entries are dropped when a book
+# is edited, deleted or sold, and expire on their own to pick up changes made elsewhere.
+# Checkout re-reads stock inside its transaction and never trusts these.
+book_cache = TTLCache(default_timeout=BOOK_CACHE_TIMEOUT)
+
+def get_book(conn, book_id):
+    """A book row by id, from book_cache when it was read recently"""
+    book = book_cache.get(book_id)
+    if book is None:
+        row = conn.execute(SQL_BOOK_BY_ID, (book_id,)).fetchone()
+        if row is None:
+            return None
+        book = dict(row)
+        book_cache.set(book_id, book)
+    return book
+
+def get_cached_books_by_ids(conn, book_ids):
+    """get_books_by_ids for display, querying only the books missing from book_cache"""
+    books = {}
+    missing = []
+    for key in book_ids:
+        book = book_cache.get(int(key))
+        if book is None:
+            missing.append(int(key))
+        else:
+            books[str(key)] = book
+    if missing:
+        placeholders = ','.join('?' * len(missing))
+        for row in conn.execute(SQL_FULL_BOOKS_BY_IDS.format(placeholders), missing):
+            book = dict(row)
+            book_cache.set(book['id'], book)
+            books[str(book['id'])] = book
+    return books
+
+def get_books_by_ids(conn, book_ids):
+    """Fetch the given books with one IN query, keyed by id as stored in the session cart"""
+    # The JSON session stores cart keys as strings; query with the integer ids
+    book_ids = [int(book_id) for book_id in book_ids]
+    if not book_ids:
+        return {}
+    placeholders = ','.join('?' * len(book_ids))
+    rows = conn.execute(SQL_BOOKS_BY_IDS.format(placeholders), book_ids).fetchall()
+    return {str(row['id']): row for row in rows}
+
+def get_page():
+    """The requested 1-based page number"""
+    return max(request.args.get('page', 1, type=int), 1)
+
+def page_count(total):
+    return max(1, -(-total // PAGE_SIZE))
+
 def allowed_file(filename):
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 # Public routes
+@app.route('/covers/<path:fname>')
+def cover(fname):
+    """Uploaded cover images; every upload gets a new filename, so they can be cached forever"""
+    response = send_from_directory(app.config['UPLOAD_FOLDER'], fname, max_age=COVER_MAX_AGE)
+    response.headers['Cache-Control'] = f'public, max-age={COVER_MAX_AGE}, immutable'
+    return response
+
 @app.route('/')
 def index():
-    conn = get_db_connection()
-    books = conn.execute('''
-        SELECT * FROM books 
-        WHERE stock > 0 
-        ORDER BY created_at DESC
-    ''').fetchall()
-    conn.close()
-    return render_template('index.html', books=books)
+    return render_template('index.html', books=get_home_books())
 
 @app.route('/book/<int:book_id>')
 def book_detail(book_id):
     conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
-    conn.close()
+    book = get_book(conn, book_id)
     
     if book is None:
         flash('Book not found.', 'error')
@@ -141,51 +279,59 @@ def search():
     genre = request.args.get('genre', '')
     author = request.args.get('author', '')
     
+    page = get_page()
+    
     conn = get_db_connection()
     
-    sql = "SELECT * FROM books WHERE stock > 0"
+    where = "stock > 0"
     params = []
     
     if query:
-        sql += " AND (title LIKE ? OR author LIKE ? OR description LIKE ?)"
-        search_term = f"%{query}%"
-        params.extend([search_term, search_term, search_term])
+        match = fts_match_query(query)
+        if match:
+            where += " AND id IN (SELECT rowid FROM books_fts WHERE books_fts MATCH ?)"
+            params.append(match)
+        else:
+            # Punctuation-only queries have no words for the full-text index
+            where += " AND (title LIKE ? OR author LIKE ? OR description LIKE ?)"
+            search_term = f"%{query}%"
+            params.extend([search_term, search_term, search_term])
     
     if genre:
-        sql += " AND genre LIKE ?"
-        params.append(f"%{genre}%")
+        where += " AND genre = ?"
+        params.append(genre)
     
     if author:
-        sql += " AND author LIKE ?"
-        params.append(f"%{author}%")
+        where += " AND author = ?"
+        params.append(author)
     
-    sql += " ORDER BY title"
-    
-    books = conn.execute(sql, params).fetchall()
+    total = conn.execute(f"SELECT COUNT(*) FROM books WHERE {where}", params).fetchone()[0]
+    # Only the first 101 characters of the description are shown in the results
+    books = conn.execute(f"""SELECT id, title, author, substr(description, 1, 101) as description, genre, price,
+                                    stock, image_filename
+                             FROM books WHERE {where}
+                             ORDER BY title, id LIMIT ? OFFSET ?""",
+                         params + [PAGE_SIZE, (page - 1) * PAGE_SIZE]).fetchall()
     
     # Get unique genres and authors for filters
-    genres = conn.execute('SELECT DISTINCT genre FROM books WHERE genre IS NOT NULL').fetchall()
-    authors = conn.execute('SELECT DISTINCT author FROM books').fetchall()
-    
-    conn.close()
+    genres, authors = get_filter_options()
     
     return render_template('search.html', books=books, genres=genres, authors=authors, 
-                         query=query, selected_genre=genre, selected_author=author)
+                         query=query, selected_genre=genre, selected_author=author,
+                         total=total, page=page, pages=page_count(total))
 
 @app.route('/add_to_cart', methods=['POST'])
 def add_to_cart():
-    book_id = request.form.get('book_id')
+    book_id = request.form.get('book_id', type=int)
     quantity = int(request.form.get('quantity', 1))
     
-    if 'cart' not in session:
-        session['cart'] = {}
-    
-    cart = session['cart']
-    if book_id in cart:
-        cart[book_id] += quantity
-    else:
-        cart[book_id] = quantity
+    if book_id is None:
+        flash('Invalid book.', 'error')
+        return redirect(request.referrer or url_for('index'))
     
+    cart = session.get('cart', {})
+    key = str(book_id)
+    cart[key] = cart.get(key, 0) + quantity
     session['cart'] = cart
     flash('Book added to cart!', 'success')
     return redirect(request.referrer or url_for('index'))
@@ -196,11 +342,12 @@ def view_cart():
         return render_template('cart.html', cart_items=[], total=0)
     
     conn = get_db_connection()
+    books = get_cached_books_by_ids(conn, session['cart'])
     cart_items = []
     total = 0
     
     for book_id, quantity in session['cart'].items():
-        book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
+        book = books.get(book_id)
         if book:
             item_total = book['price'] * quantity
             cart_items.append({
@@ -210,7 +357,6 @@ def view_cart():
             })
             total += item_total
     
-    conn.close()
     return render_template('cart.html', cart_items=cart_items, total=total)
 
 @app.route('/checkout', methods=['GET', 'POST'])
@@ -225,12 +371,19 @@ def checkout():
         
         conn = get_db_connection()
         
-        # Calculate total
+        # Validate and total the cart from one read, outside the write lock; the guarded
+        # decrement below catches stock that another checkout takes in the meantime
+        books = get_books_by_ids(conn, session['cart'])
         total = 0
         cart_items = []
         for book_id, quantity in session['cart'].items():
-            book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
-            if book and book['stock'] >= quantity:
+            book = books.get(book_id)
+            if book is None:
+                flash('A book in your cart is no longer available and has been removed.', 'error')
+                del session['cart'][book_id]
+                session.modified = True
+                return redirect(url_for('view_cart'))
+            if book['stock'] >= quantity:
                 item_total = book['price'] * quantity
                 cart_items.append({
                     'book_id': book_id,
@@ -240,28 +393,28 @@ def checkout():
                 total += item_total
             else:
                 flash(f'Insufficient stock for {book["title"]}', 'error')
-                conn.close()
                 return redirect(url_for('view_cart'))
         
+        conn.execute('BEGIN IMMEDIATE')
+        updated = conn.executemany(SQL_DECREMENT_STOCK,
+                                   [(item['quantity'], item['book_id'], item['quantity']) for item in cart_items]).rowcount
+        if updated != len(cart_items):
+            conn.rollback()
+            flash('Some books in your cart just sold out. Please review your cart.', 'error')
+            return redirect(url_for('view_cart'))
+        
         # Create order
         order_id = str(uuid.uuid4())[:8].upper()
-        conn.execute('''INSERT INTO orders (order_id, customer_name, customer_email, total_amount)
-                       VALUES (?, ?, ?, ?)''', (order_id, customer_name, customer_email, total))
-        
-        # Add order items and update stock
-        for item in cart_items:
-            conn.execute('''INSERT INTO order_items (order_id, book_id, quantity, price)
-                           VALUES (?, ?, ?, ?)''', 
-                        (order_id, item['book_id'], item['quantity'], item['price']))
-            
-            # Update stock
-            conn.execute('UPDATE books SET stock = stock - ? WHERE id = ?',
-                        (item['quantity'], item['book_id']))
+        conn.execute(SQL_INSERT_ORDER, (order_id, customer_name, customer_email, total))
+        conn.executemany(SQL_INSERT_ORDER_ITEM,
+                         [(order_id, item['book_id'], item['quantity'], item['price']) for item in cart_items])
         
         conn.commit()
-        conn.close()
         
         # Clear cart
+        clear_catalog_cache()
+        for item in cart_items:
+            book_cache.delete(int(item['book_id']))
         session.pop('cart', None)
         flash(f'Order {order_id} placed successfully!', 'success')
         return redirect(url_for('index'))
@@ -277,9 +430,8 @@ def admin_login():
         
         conn = get_db_connection()
         admin = conn.execute('SELECT * FROM admins WHERE username = ?', (username,)).fetchone()
-        conn.close()
         
-        if admin and check_password_hash(admin['password_hash'], password):
+        if admin and check_password_cached(admin['username'], admin['password_hash'], password):
             session['admin_id'] = admin['id']
             session['admin_username'] = admin['username']
             flash('Welcome to the admin panel!', 'success')
@@ -299,31 +451,32 @@ def admin_logout():
 @app.route('/admin')
 @login_required
 def admin_dashboard():
-    conn = get_db_connection()
-    
-    # Get statistics
-    total_books = conn.execute('SELECT COUNT(*) as count FROM books').fetchone()['count']
-    total_stock = conn.execute('SELECT SUM(stock) as total FROM books').fetchone()['total'] or 0
-    low_stock_books = conn.execute('SELECT COUNT(*) as count FROM books WHERE stock < 5').fetchone()['count']
-    recent_orders = conn.execute('SELECT COUNT(*) as count FROM orders WHERE date(created_at) = date("now")').fetchone()['count']
-    
-    stats = {
-        'total_books': total_books,
-        'total_stock': total_stock,
-        'low_stock_books': low_stock_books,
-        'recent_orders': recent_orders
-    }
-    
-    conn.close()
-    return render_template('admin/dashboard.html', stats=stats)
+    return render_template('admin/dashboard.html', stats=get_dashboard_stats())
 
 @app.route('/admin/books')
 @login_required
 def admin_books():
     conn = get_db_connection()
-    books = conn.execute('SELECT * FROM books ORDER BY created_at DESC').fetchall()
-    conn.close()
-    return render_template('admin/books.html', books=books)
+    after_created = request.args.get('after_created')
+    after_id = request.args.get('after_id', type=int)
+    # Newest first, continuing after the (created_at, id) of the previous page's last row
+    # so deep pages are an index range scan rather than an OFFSET skip
+    if after_created is not None and after_id is not None:
+        seek, params = 'WHERE (created_at, id) < (?, ?)', (after_created, after_id, PAGE_SIZE + 1)
+    else:
+        seek, params = '', (PAGE_SIZE + 1,)
+    # Only the first 51 characters of the description are shown in the list
+    books = conn.execute(f'''
+        SELECT id, title, author, substr(description, 1, 51) as description, genre, price, stock,
+               image_filename, created_at
+        FROM books
+        {seek}
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+    ''', params).fetchall()
+    # The extra row only says whether there is a next page
+    next_cursor = (books[PAGE_SIZE - 1]['created_at'], books[PAGE_SIZE - 1]['id']) if len(books) > PAGE_SIZE else None
+    return render_template('admin/books.html', books=books[:PAGE_SIZE], next_cursor=next_cursor)
 
 @app.route('/admin/books/add', methods=['GET', 'POST'])
 @login_required
@@ -363,16 +516,17 @@ def admin_add_book():
                 filename = secure_filename(file.filename)
                 # Add timestamp to avoid conflicts
                 name, ext = os.path.splitext(filename)
-                image_filename = f"{name}_{int(datetime.now().timestamp())}{ext}"
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], image_filename))
+                upload_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{name}_{int(datetime.now().timestamp())}{ext}")
+                file.save(upload_path)
+                image_filename = optimize_cover(upload_path)
         
         conn = get_db_connection()
         conn.execute('''INSERT INTO books (title, author, description, price, stock, genre, image_filename)
                        VALUES (?, ?, ?, ?, ?, ?, ?)''',
                     (title, author, description, price, stock, genre, image_filename))
         conn.commit()
-        conn.close()
         
+        clear_catalog_cache()
         flash('Book added successfully!', 'success')
         return redirect(url_for('admin_books'))
     
@@ -382,7 +536,7 @@ def admin_add_book():
 @login_required
 def admin_edit_book(book_id):
     conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
+    book = conn.execute(SQL_BOOK_BY_ID, (book_id,)).fetchone()
     
     if book is None:
         flash('Book not found.', 'error')
@@ -420,90 +574,81 @@ def admin_edit_book(book_id):
         if 'image' in request.files:
             file = request.files['image']
             if file and file.filename and allowed_file(file.filename):
-                # Delete old image if exists
-                if image_filename:
-                    old_path = os.path.join(app.config['UPLOAD_FOLDER'], image_filename)
-                    if os.path.exists(old_path):
-                        os.remove(old_path)
-                
                 filename = secure_filename(file.filename)
                 name, ext = os.path.splitext(filename)
-                image_filename = f"{name}_{int(datetime.now().timestamp())}{ext}"
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], image_filename))
+                upload_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{name}_{int(datetime.now().timestamp())}{ext}")
+                file.save(upload_path)
+                image_filename = optimize_cover(upload_path)
         
         conn.execute('''UPDATE books SET title=?, author=?, description=?, price=?, stock=?, genre=?, image_filename=?
                        WHERE id=?''',
                     (title, author, description, price, stock, genre, image_filename, book_id))
         conn.commit()
-        conn.close()
         
+        # The old image is only dropped once the new one is committed
+        if image_filename != book['image_filename'] and book['image_filename']:
+            remove_cover(app.config['UPLOAD_FOLDER'], book['image_filename'])
+        
+        clear_catalog_cache()
+        book_cache.delete(book_id)
         flash('Book updated successfully!', 'success')
         return redirect(url_for('admin_books'))
     
-    conn.close()
     return render_template('admin/edit_book.html', book=book)
 
 @app.route('/admin/books/<int:book_id>/delete', methods=['POST'])
 @login_required
 def admin_delete_book(book_id):
     conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
+    book = conn.execute(SQL_BOOK_BY_ID, (book_id,)).fetchone()
     
     if book:
-        # Delete image file if exists
-        if book['image_filename']:
-            image_path = os.path.join(app.config['UPLOAD_FOLDER'], book['image_filename'])
-            if os.path.exists(image_path):
-                os.remove(image_path)
-        
         conn.execute('DELETE FROM books WHERE id = ?', (book_id,))
         conn.commit()
+        
+        # Delete image file if exists, once the row is gone for good
+        if book['image_filename']:
+            remove_cover(app.config['UPLOAD_FOLDER'], book['image_filename'])
+        clear_catalog_cache()
+        book_cache.delete(book_id)
         flash('Book deleted successfully!', 'success')
     else:
         flash('Book not found.', 'error')
     
-    conn.close()
     return redirect(url_for('admin_books'))
 
 @app.route('/admin/inventory')
 @login_required
 def admin_inventory():
+    page = get_page()
     conn = get_db_connection()
-    books = conn.execute('SELECT * FROM books ORDER BY stock ASC, title').fetchall()
-    conn.close()
-    return render_template('admin/inventory.html', books=books)
+    books = conn.execute('SELECT * FROM books ORDER BY stock ASC, title, id LIMIT ? OFFSET ?',
+                         (PAGE_SIZE, (page - 1) * PAGE_SIZE)).fetchall()
+    total_books = get_dashboard_stats()['total_books']
+    return render_template('admin/inventory.html', books=books, total_books=total_books,
+                           page=page, pages=page_count(total_books))
 
 @app.route('/admin/inventory/export')
 @login_required
 def admin_export_inventory():
-    conn = get_db_connection()
-    books = conn.execute('SELECT * FROM books ORDER BY title').fetchall()
-    conn.close()
+    def generate():
+        # stream_with_context keeps the request's connection open until the last row is sent
+        conn = get_db_connection()
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['ID', 'Title', 'Author', 'Genre', 'Price', 'Stock', 'Created Date'])
+        for book in conn.execute('SELECT id, title, author, genre, price, stock, created_at FROM books ORDER BY title'):
+            writer.writerow([
+                book['id'], book['title'], book['author'], book['genre'] or '',
+                book['price'], book['stock'], book['created_at']
+            ])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
     
-    # Create CSV response
-    output = []
-    output.append(['ID', 'Title', 'Author', 'Genre', 'Price', 'Stock', 'Created Date'])
-    
-    for book in books:
-        output.append([
-            book['id'],
-            book['title'],
-            book['author'],
-            book['genre'] or '',
-            book['price'],
-            book['stock'],
-            book['created_at']
-        ])
-    
-    # Generate CSV file
-    import io
-    csv_output = io.StringIO()
-    csv_writer = csv.writer(csv_output)
-    csv_writer.writerows(output)
-    
-    from flask import Response
     return Response(
-        csv_output.getvalue(),
+        stream_with_context(generate()),
         mimetype="text/csv",
         headers={"Content-disposition": f"attachment; filename=inventory_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"}
     )
@@ -511,16 +656,19 @@ def admin_export_inventory():
 @app.route('/admin/orders')
 @login_required
 def admin_orders():
+    page = get_page()
     conn = get_db_connection()
+    total = conn.execute('SELECT COUNT(*) FROM orders').fetchone()[0]
+    # Count items per order first, then join that small aggregate to one page of orders
     orders = conn.execute('''
-        SELECT o.*, COUNT(oi.id) as item_count
+        SELECT o.*, COALESCE(ic.item_count, 0) as item_count
         FROM orders o
-        LEFT JOIN order_items oi ON o.order_id = oi.order_id
-        GROUP BY o.id
+        LEFT JOIN (SELECT order_id, COUNT(*) as item_count FROM order_items GROUP BY order_id) ic
+            ON ic.order_id = o.order_id
         ORDER BY o.created_at DESC
-    ''').fetchall()
-    conn.close()
-    return render_template('admin/orders.html', orders=orders)
+        LIMIT ? OFFSET ?
+    ''', (PAGE_SIZE, (page - 1) * PAGE_SIZE)).fetchall()
+    return render_template('admin/orders.html', orders=orders, page=page, pages=page_count(total))
 
 if __name__ == '__main__':
     init_db()
@@ -1,16 +1,19 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, Request, render_template, request, redirect, url_for, flash, session, jsonify, send_from_directory
 from werkzeug.utils import secure_filename
 import os
+import json
 import uuid
 from datetime import datetime
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
 
 # Add the current directory to Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Import our modules
 try:
-    from models.database import Database
+    from models.database import Database, fts_match_query
     from utils.analytics import Analytics
     from admin.routes import admin
 except ImportError as e:
@@ -20,51 +23,88 @@ except ImportError as e:
     Analytics = None
     admin = None
 
+from utils.images import thumbnail_name
+
+class UploadRequest(Request):
+    """Request that spills uploaded files to disk once they pass 64KB"""
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return SpooledTemporaryFile(max_size=64 * 1024, mode='rb+')
+
 app = Flask(__name__)
+app.request_class = UploadRequest
 app.config['SECRET_KEY'] = 'your-secret-key-change-in-production'
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['MAX_CONTENT_LENGTH'] = 8 * 1024 * 1024  # 8MB max file size
+
+COVER_MAX_AGE = 365 * 24 * 60 * 60
+PAGE_SIZE = 24
+# Ids are bound as one JSON array, so every cart size reuses the same prepared statement
+SQL_BOOKS_BY_IDS = ('SELECT id, title, author, price, stock, image_filename FROM books '
+                    'WHERE id IN (SELECT value FROM json_each(?))')
+# The home page shows this many books, and links to search when there are more
+HOME_FEATURED_BOOKS = 8
+
+# Cover image saves and deletes run here so they overlap with the database write
+app.io_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='upload-io')
 
 # Ensure upload directory exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+# List pages show the small WebP rendition of a cover
+app.add_template_filter(thumbnail_name, 'thumbnail')
+
 # Initialize database and analytics
 db = Database()
 analytics = Analytics()
+app.extensions['db'] = db
+app.extensions['analytics'] = analytics
 
 # Register blueprints
 app.register_blueprint(admin)
 
+def get_books_by_ids(conn, book_ids):
+    """Fetch the given books with one IN query, keyed by id as stored in the session cart"""
+    # The JSON session stores cart keys as strings; query with the integer ids
+    book_ids = [int(book_id) for book_id in book_ids]
+    if not book_ids:
+        return {}
+    rows = conn.execute(SQL_BOOKS_BY_IDS, (json.dumps(book_ids),)).fetchall()
+    return {str(row['id']): row for row in rows}
+
+def save_cart(cart):
+    """Store the cart with its item count so the navbar count needs no summing"""
+    session['cart'] = cart
+    session['cart_count'] = sum(cart.values())
+
 # Public routes
+@app.route('/covers/<path:fname>')
+def cover(fname):
+    """Uploaded cover images; every upload gets a new filename, so they can be cached forever"""
+    response = send_from_directory(app.config['UPLOAD_FOLDER'], fname, max_age=COVER_MAX_AGE)
+    response.headers['Cache-Control'] = f'public, max-age={COVER_MAX_AGE}, immutable'
+    return response
+
 @app.route('/')
 def index():
-    conn = db.get_connection()
-    books = conn.execute('''
-        SELECT * FROM books 
-        WHERE stock > 0 
-        ORDER BY created_at DESC
-    ''').fetchall()
-    conn.close()
-    return render_template('index.html', books=books)
+    # One extra row tells the template there are more books to link to
+    return render_template('index.html', books=db.get_in_stock_books(HOME_FEATURED_BOOKS + 1))
 
 @app.route('/book/<int:book_id>')
 def book_detail(book_id):
-    conn = db.get_connection()
-    book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
+    with db.reader.acquire() as conn:
+        book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
     
-    if book is None:
-        flash('Book not found.', 'error')
-        return redirect(url_for('index'))
+        if book is None:
+            flash('Book not found.', 'error')
+            return redirect(url_for('index'))
     
-    # Get related books (same genre, different book)
-    related_books = conn.execute('''
-        SELECT * FROM books 
-        WHERE genre = ? AND id != ? AND stock > 0 
-        ORDER BY RANDOM() 
-        LIMIT 4
-    ''', (book['genre'], book_id)).fetchall()
+        # Get related books (same genre, different book); the sampled ids are cached so
+        # ORDER BY RANDOM() over the genre runs once per couple of minutes, not per view
+        related_ids = db.get_related_book_ids(book['genre'], book_id)
+        related = get_books_by_ids(conn, related_ids)
+        related_books = [related[str(related_id)] for related_id in related_ids if str(related_id) in related]
     
-    conn.close()
     return render_template('book_detail.html', book=book, related_books=related_books)
 
 @app.route('/search')
@@ -76,51 +116,61 @@ def search():
     max_price = request.args.get('max_price', '')
     sort_by = request.args.get('sort', 'title')
     
-    conn = db.get_connection()
+    page = max(request.args.get('page', 1, type=int), 1)
     
-    sql = "SELECT * FROM books WHERE stock > 0"
-    params = []
+    with db.reader.acquire() as conn:
+        where = "stock > 0"
+        params = []
     
-    if query:
-        sql += " AND (title LIKE ? OR author LIKE ? OR description LIKE ?)"
-        search_term = f"%{query}%"
-        params.extend([search_term, search_term, search_term])
+        if query:
+            match = fts_match_query(query)
+            if match:
+                where += " AND id IN (SELECT rowid FROM books_fts WHERE books_fts MATCH ?)"
+                params.append(match)
+            else:
+                # Punctuation-only queries have no words for the full-text index
+                where += " AND (title LIKE ? OR author LIKE ? OR description LIKE ?)"
+                search_term = f"%{query}%"
+                params.extend([search_term, search_term, search_term])
     
-    if genre:
-        sql += " AND genre LIKE ?"
-        params.append(f"%{genre}%")
+        if genre:
+            where += " AND genre = ?"
+            params.append(genre)
     
-    if author:
-        sql += " AND author LIKE ?"
-        params.append(f"%{author}%")
+        if author:
+            where += " AND author = ?"
+            params.append(author)
     
-    if min_price:
-        sql += " AND price >= ?"
-        params.append(float(min_price))
+        if min_price:
+            where += " AND price >= ?"
+            params.append(float(min_price))
     
-    if max_price:
-        sql += " AND price <= ?"
-        params.append(float(max_price))
+        if max_price:
+            where += " AND price <= ?"
+            params.append(float(max_price))
     
-    # Sort options
-    if sort_by == 'price_low':
-        sql += " ORDER BY price ASC"
-    elif sort_by == 'price_high':
-        sql += " ORDER BY price DESC"
-    elif sort_by == 'newest':
-        sql += " ORDER BY created_at DESC"
-    elif sort_by == 'author':
-        sql += " ORDER BY author"
-    else:
-        sql += " ORDER BY title"
+        # Sort options; id breaks ties so OFFSET pages don't repeat or skip tied rows
+        if sort_by == 'price_low':
+            order_by = "price ASC, id"
+        elif sort_by == 'price_high':
+            order_by = "price DESC, id"
+        elif sort_by == 'newest':
+            order_by = "created_at DESC, id DESC"
+        elif sort_by == 'author':
+            order_by = "author, id"
+        else:
+            order_by = "title, id"
     
-    books = conn.execute(sql, params).fetchall()
+        total = conn.execute(f"SELECT COUNT(*) FROM books WHERE {where}", params).fetchone()[0]
+        # Only the first 101 characters of the description are shown in the results
+        books = conn.execute(f"""SELECT id, title, author, substr(description, 1, 101) as description, genre, price,
+                                        stock, image_filename
+                                 FROM books WHERE {where}
+                                 ORDER BY {order_by} LIMIT ? OFFSET ?""",
+                             params + [PAGE_SIZE, (page - 1) * PAGE_SIZE]).fetchall()
     
     # Get filter options
-    genres = conn.execute('SELECT DISTINCT genre FROM books WHERE genre IS NOT NULL AND stock > 0').fetchall()
-    authors = conn.execute('SELECT DISTINCT author FROM books WHERE stock > 0').fetchall()
-    
-    conn.close()
+    genres, authors = db.get_filter_options()
     
     return render_template('search.html', 
                          books=books, 
@@ -131,23 +181,24 @@ def search():
                          selected_author=author,
                          min_price=min_price,
                          max_price=max_price,
-                         sort_by=sort_by)
+                         sort_by=sort_by,
+                         total=total,
+                         page=page,
+                         pages=max(1, -(-total // PAGE_SIZE)))
 
 @app.route('/add_to_cart', methods=['POST'])
 def add_to_cart():
-    book_id = request.form.get('book_id')
+    book_id = request.form.get('book_id', type=int)
     quantity = int(request.form.get('quantity', 1))
     
-    if 'cart' not in session:
-        session['cart'] = {}
-    
-    cart = session['cart']
-    if book_id in cart:
-        cart[book_id] += quantity
-    else:
-        cart[book_id] = quantity
+    if book_id is None:
+        flash('Invalid book.', 'error')
+        return redirect(request.referrer or url_for('index'))
     
-    session['cart'] = cart
+    cart = session.get('cart', {})
+    key = str(book_id)
+    cart[key] = cart.get(key, 0) + quantity
+    save_cart(cart)
     flash('Book added to cart!', 'success')
     return redirect(request.referrer or url_for('index'))
 
@@ -156,12 +207,15 @@ def view_cart():
     if 'cart' not in session or not session['cart']:
         return render_template('cart.html', cart_items=[], total=0)
     
-    conn = db.get_connection()
+    with db.reader.acquire() as conn:
+        books = get_books_by_ids(conn, session['cart'])
+    cart = session['cart']
     cart_items = []
     total = 0
     
-    for book_id, quantity in session['cart'].items():
-        book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
+    # Iterate over a copy: out-of-stock books are removed from the cart as we go
+    for book_id, quantity in list(cart.items()):
+        book = books.get(book_id)
         if book and book['stock'] >= quantity:
             item_total = book['price'] * quantity
             cart_items.append({
@@ -172,7 +226,7 @@ def view_cart():
             total += item_total
         elif book:
             # Update cart if stock is insufficient
-            session['cart'][book_id] = book['stock']
+            cart[book_id] = book['stock']
             if book['stock'] > 0:
                 item_total = book['price'] * book['stock']
                 cart_items.append({
@@ -183,34 +237,38 @@ def view_cart():
                 total += item_total
                 flash(f'Quantity for "{book["title"]}" adjusted to available stock.', 'warning')
             else:
-                del session['cart'][book_id]
+                del cart[book_id]
                 flash(f'"{book["title"]}" is out of stock and removed from cart.', 'warning')
+            save_cart(cart)
     
-    conn.close()
     return render_template('cart.html', cart_items=cart_items, total=total)
 
 @app.route('/remove_from_cart', methods=['POST'])
 def remove_from_cart():
-    book_id = request.form.get('book_id')
+    book_id = request.form.get('book_id', type=int)
+    cart = session.get('cart', {})
     
-    if 'cart' in session and book_id in session['cart']:
-        del session['cart'][book_id]
+    if book_id is not None and str(book_id) in cart:
+        del cart[str(book_id)]
+        save_cart(cart)
         flash('Item removed from cart!', 'info')
     
     return redirect(url_for('view_cart'))
 
 @app.route('/update_cart', methods=['POST'])
 def update_cart():
-    book_id = request.form.get('book_id')
+    book_id = request.form.get('book_id', type=int)
     quantity = int(request.form.get('quantity', 1))
+    cart = session.get('cart', {})
     
-    if 'cart' in session and book_id in session['cart']:
+    if book_id is not None and str(book_id) in cart:
         if quantity > 0:
-            session['cart'][book_id] = quantity
+            cart[str(book_id)] = quantity
             flash('Cart updated!', 'success')
         else:
-            del session['cart'][book_id]
+            del cart[str(book_id)]
             flash('Item removed from cart!', 'info')
+        save_cart(cart)
     
     return redirect(url_for('view_cart'))
 
@@ -227,63 +285,76 @@ def checkout():
         shipping_address = request.form.get('shipping_address', '')
         payment_method = request.form.get('payment_method', 'cash_on_delivery')
         
-        conn = db.get_connection()
+        with db.writer.acquire() as conn:
+            # Validate and total the cart from one read, outside the write lock; the guarded
+            # decrement below catches stock that another checkout takes in the meantime
+            books = get_books_by_ids(conn, session['cart'])
+            total = 0
+            cart_items = []
+            for book_id, quantity in session['cart'].items():
+                book = books.get(book_id)
+                if book is None:
+                    flash('A book in your cart is no longer available and has been removed.', 'error')
+                    cart = session['cart']
+                    del cart[book_id]
+                    save_cart(cart)
+                    return redirect(url_for('view_cart'))
+                if book['stock'] >= quantity:
+                    item_total = book['price'] * quantity
+                    cart_items.append({
+                        'book_id': book_id,
+                        'quantity': quantity,
+                        'price': book['price']
+                    })
+                    total += item_total
+                else:
+                    flash(f'Insufficient stock for "{book["title"]}" (Available: {book["stock"]})', 'error')
+                    return redirect(url_for('view_cart'))
         
-        # Calculate total and prepare items
-        total = 0
-        cart_items = []
-        for book_id, quantity in session['cart'].items():
-            book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
-            if book and book['stock'] >= quantity:
-                item_total = book['price'] * quantity
-                cart_items.append({
-                    'book_id': book_id,
-                    'quantity': quantity,
-                    'price': book['price']
-                })
-                total += item_total
-            else:
-                flash(f'Insufficient stock for "{book["title"]}" (Available: {book["stock"]})', 'error')
-                conn.close()
+            conn.execute('BEGIN IMMEDIATE')
+            updated = conn.executemany('UPDATE books SET stock = stock - ? WHERE id = ? AND stock >= ?',
+                                       [(item['quantity'], item['book_id'], item['quantity']) for item in cart_items]).rowcount
+            if updated != len(cart_items):
+                # Leaving the block hands the connection back, rolling the partial decrement back
+                flash('Some books in your cart just sold out. Please review your cart.', 'error')
                 return redirect(url_for('view_cart'))
         
-        # Create order
-        order_id = str(uuid.uuid4())[:8].upper()
-        conn.execute('''INSERT INTO orders (order_id, customer_name, customer_email, customer_phone, 
-                                          shipping_address, total_amount, payment_method)
-                       VALUES (?, ?, ?, ?, ?, ?, ?)''', 
-                    (order_id, customer_name, customer_email, customer_phone, 
-                     shipping_address, total, payment_method))
+            # Create order
+            order_id = str(uuid.uuid4())[:8].upper()
+            conn.execute('''INSERT INTO orders (order_id, customer_name, customer_email, customer_phone, 
+                                              shipping_address, total_amount, payment_method)
+                           VALUES (?, ?, ?, ?, ?, ?, ?)''', 
+                        (order_id, customer_name, customer_email, customer_phone, 
+                         shipping_address, total, payment_method))
+        
+            conn.executemany('''INSERT INTO order_items (order_id, book_id, quantity, price)
+                                VALUES (?, ?, ?, ?)''',
+                             [(order_id, item['book_id'], item['quantity'], item['price']) for item in cart_items])
         
-        # Add order items and update stock
-        for item in cart_items:
-            conn.execute('''INSERT INTO order_items (order_id, book_id, quantity, price)
-                           VALUES (?, ?, ?, ?)''', 
-                        (order_id, item['book_id'], item['quantity'], item['price']))
-            
-            # Update stock
-            conn.execute('UPDATE books SET stock = stock - ? WHERE id = ?',
-                        (item['quantity'], item['book_id']))
+            # Add notification for admin
+            db.add_notification('new_order', 'New Order Received', 
+                              f'Order {order_id} placed by {customer_name} for ${total:.2f}', conn=conn)
         
-        conn.commit()
-        conn.close()
+            conn.commit()
         
-        # Add notification for admin
-        db.add_notification('new_order', 'New Order Received', 
-                          f'Order {order_id} placed by {customer_name} for ${total:.2f}')
+        analytics.clear_cache()
+        db.clear_catalog_cache()
+        db.clear_notification_cache()
         
         # Clear cart
         session.pop('cart', None)
+        session.pop('cart_count', None)
         flash(f'Order {order_id} placed successfully! You will receive a confirmation email shortly.', 'success')
         return render_template('order_confirmation.html', order_id=order_id, total=total)
     
     # Calculate cart total for display
-    conn = db.get_connection()
+    with db.reader.acquire() as conn:
+        books = get_books_by_ids(conn, session['cart'])
     cart_items = []
     total = 0
     
     for book_id, quantity in session['cart'].items():
-        book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
+        book = books.get(book_id)
         if book:
             item_total = book['price'] * quantity
             cart_items.append({
@@ -293,14 +364,19 @@ def checkout():
             })
             total += item_total
     
-    conn.close()
     return render_template('checkout.html', cart_items=cart_items, total=total)
 
 # API endpoints for AJAX requests
 @app.route('/api/cart/count')
 def api_cart_count():
-    count = sum(session.get('cart', {}).values())
-    return jsonify({'count': count})
+    count = session.get('cart_count')
+    if count is None:
+        # Sessions from before the count was stored
+        count = sum(session.get('cart', {}).values())
+    response = jsonify({'count': count})
+    # Polled on every page view; a browser may reuse the answer for a few seconds
+    response.headers['Cache-Control'] = 'private, max-age=5'
+    return response
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=3000, debug=True)
\ No newline at end of file
@@ -4,15 +4,8 @@
 # In[1]:
 
 
-get_ipython().system('pip install python-dotenv')
-
-
-# In[2]:
-
-
 import os
-import base64
-from dotenv import set_key, load_dotenv
+import secrets
 
 # File path to .env (change if needed)
 ENV_PATH = ".env"
@@ -20,21 +13,31 @@ ENV_PATH = ".env"
 def generate_secure_key(length=32):
     """
     Generate a secure random key of specified byte length.
-    Returns base64-encoded string (suitable for env variables).
+    Returns an unpadded base64url string (suitable for env variables).
     """
-    return base64.urlsafe_b64encode(os.urandom(length)).decode()
+    return secrets.token_urlsafe(length)
 
 def write_keys_to_env(aes_key: str, jwt_secret: str, env_path=ENV_PATH):
     """
-    Save AES and JWT secret keys to a .env file.
+    Save AES and JWT secret keys to a .env file with one read and one write,
+    keeping every other line as it was.
     """
-    # Create .env if it doesn't exist
-    if not os.path.exists(env_path):
-        open(env_path, 'w').close()
-
-    load_dotenv(env_path)  # Load existing .env
-    set_key(env_path, "AES256_KEY", aes_key)
-    set_key(env_path, "JWT_SECRET_KEY", jwt_secret)
+    updates = {"AES256_KEY": aes_key, "JWT_SECRET_KEY": jwt_secret}
+    lines = []
+    if os.path.exists(env_path):
+        with open(env_path, encoding='utf-8') as f:
+            lines = f.readlines()
+    if lines and not lines[-1].endswith('\n'):
+        lines[-1] += '\n'
+
+    for i, line in enumerate(lines):
+        key = line.split('=', 1)[0].strip()
+        if '=' in line and key in updates:
+            lines[i] = f"{key}='{updates.pop(key)}'\n"
+    lines.extend(f"{key}='{value}'\n" for key, value in updates.items())
+
+    with open(env_path, 'w', encoding='utf-8') as f:
+        f.write(''.join(lines))
 
 if __name__ == "__main__":
     # Step 1: Generate AES-256 and JWT keys (32-byte base64-encoded)
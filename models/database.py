@@ -1,22 +1,158 @@
 import sqlite3
 import os
+import queue
+import re
+import threading
+from contextlib import contextmanager
 from datetime import datetime
+from pathlib import Path
 from werkzeug.security import generate_password_hash
 
+from utils.cache import cache
+
+# Per-connection settings; journal_mode=WAL is persistent and is set in init_db
+# foreign_keys stays off: order_items references books with no ON DELETE action, so
+# enforcing it would make delete_book fail for any book that has been sold
+CONNECTION_PRAGMAS = (
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA cache_size=-65536',
+    'PRAGMA busy_timeout=10000',
+)
+
+# Stored in PRAGMA user_version once init_db has run; bump it whenever init_db changes
+SCHEMA_VERSION = 1
+
+# Prepared statements kept per pooled connection. Generated search SQL would otherwise
+# push the fixed queries out of sqlite3's default 128-entry cache
+STATEMENT_CACHE_SIZE = 256
+
+def cents(amount):
+    """SQL for a REAL dollar amount as whole cents"""
+    return f'CAST(ROUND({amount} * 100) AS INTEGER)'
+
+def configure_connection(conn):
+    """Apply the per-connection PRAGMAs to a freshly opened connection"""
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+class ConnectionPool:
+    """Thread-safe pool of configured connections to one database file"""
+    
+    def __init__(self, path, size=None, readonly=False, isolation_level=''):
+        self.path = path
+        self.size = size or os.cpu_count() or 4
+        self.readonly = readonly
+        self.isolation_level = isolation_level
+        # LIFO hands out the most recently used connection, whose page cache is warmest
+        self._idle = queue.LifoQueue(maxsize=self.size)
+        for _ in range(self.size):
+            self._idle.put(self._connect())
+    
+    def _connect(self):
+        if self.readonly:
+            conn = sqlite3.connect(Path(self.path).resolve().as_uri() + '?mode=ro', uri=True,
+                                   check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+        else:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=self.isolation_level,
+                                   cached_statements=STATEMENT_CACHE_SIZE)
+        conn.row_factory = sqlite3.Row
+        return configure_connection(conn)
+    
+    def checkout(self):
+        """Take an idle connection, opening an extra one if every pooled connection is busy"""
+        # Never blocks: a request holding one connection may ask for another, and waiting
+        # here could deadlock once all connections are held that way
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+    
+    def checkin(self, conn):
+        """Return a connection to the pool, rolling back anything left uncommitted"""
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+    
+    @contextmanager
+    def acquire(self):
+        conn = self.checkout()
+        try:
+            yield conn
+        finally:
+            self.checkin(conn)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_path, readonly=False):
+    """The process-wide reader or writer pool for a database file, shared by Database and Analytics"""
+    with _pools_lock:
+        pool = _pools.get((db_path, readonly))
+        if pool is None:
+            if readonly:
+                pool = ConnectionPool(db_path, readonly=True)
+            else:
+                # WAL allows one writer at a time, so one warm connection is enough; every
+                # write transaction takes the write lock up front instead of upgrading to it
+                # mid-transaction, where a busy database cannot be waited out
+                pool = ConnectionPool(db_path, size=1, isolation_level='IMMEDIATE')
+            _pools[db_path, readonly] = pool
+        return pool
+
+def fts_match_query(text):
+    """Turn free text into an FTS5 query matching every word as a prefix, or None if it has no words"""
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+def create_books_fts(c):
+    """Create the full-text index over the searchable book columns and the triggers keeping it in sync"""
+    fts_exists = c.execute("SELECT 1 FROM sqlite_master WHERE name = 'books_fts'").fetchone()
+    c.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS books_fts
+                 USING fts5(title, author, description, content='books', content_rowid='id')''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS books_fts_insert AFTER INSERT ON books BEGIN
+                     INSERT INTO books_fts (rowid, title, author, description)
+                     VALUES (new.id, new.title, new.author, new.description);
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS books_fts_delete AFTER DELETE ON books BEGIN
+                     INSERT INTO books_fts (books_fts, rowid, title, author, description)
+                     VALUES ('delete', old.id, old.title, old.author, old.description);
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS books_fts_update AFTER UPDATE OF title, author, description ON books BEGIN
+                     INSERT INTO books_fts (books_fts, rowid, title, author, description)
+                     VALUES ('delete', old.id, old.title, old.author, old.description);
+                     INSERT INTO books_fts (rowid, title, author, description)
+                     VALUES (new.id, new.title, new.author, new.description);
+                 END''')
+    if not fts_exists:
+        c.execute("INSERT INTO books_fts (books_fts) VALUES ('rebuild')")
+
 class Database:
     def __init__(self, db_path='bookstore.db'):
         self.db_path = db_path
         self.init_db()
-    
-    def get_connection(self):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        self.reader = get_pool(db_path, readonly=True)
+        self.writer = get_pool(db_path)
     
     def init_db(self):
-        conn = sqlite3.connect(self.db_path)
+        conn = configure_connection(sqlite3.connect(self.db_path))
         c = conn.cursor()
         
+        # The schema, migrations and seed data below are already in place
+        if c.execute('PRAGMA user_version').fetchone()[0] >= SCHEMA_VERSION:
+            conn.close()
+            return
+        
+        # WAL is persistent, so setting it once lets readers run alongside writers
+        c.execute('PRAGMA journal_mode=WAL')
+        
         # Books table
         c.execute('''CREATE TABLE IF NOT EXISTS books (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -88,6 +224,115 @@ class Database:
                         FOREIGN KEY (book_id) REFERENCES books (id)
                     )''')
         
+        # Indexes backing the admin list views and order joins
+        # Ascending (created_at, id) so the newest-first keyset listing is one backward range scan
+        c.execute('CREATE INDEX IF NOT EXISTS idx_books_created_id ON books(created_at, id)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_books_stock_title ON books(stock ASC, title)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_books_genre ON books(genre)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_books_author ON books(author)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_oi_order ON order_items(order_id)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_oi_book ON order_items(book_id)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_orders_created ON orders(created_at DESC)')
+        # Holds only unread rows, so the badge count stays small however many are read; the
+        # condition must match the query's "is_read = FALSE" for the planner to use it
+        c.execute('CREATE INDEX IF NOT EXISTS idx_notifications_unread_id ON notifications(id) WHERE is_read = FALSE')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_notifications_created ON notifications(created_at)')
+        
+        create_books_fts(c)
+        
+        # Monthly and weekly order totals kept current by triggers on orders, so
+        # the sales charts read a handful of rows instead of scanning every order
+        summary_exists = c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sales_summary'").fetchone()
+        c.execute('''CREATE TABLE IF NOT EXISTS sales_summary (
+                        bucket TEXT NOT NULL,
+                        key TEXT NOT NULL,
+                        order_count INTEGER NOT NULL DEFAULT 0,
+                        revenue_cents INTEGER NOT NULL DEFAULT 0,
+                        PRIMARY KEY (bucket, key)
+                    ) WITHOUT ROWID''')
+        for name, event, row, sign in (('sales_summary_order_insert', 'INSERT', 'NEW', '+'),
+                                       ('sales_summary_order_delete', 'DELETE', 'OLD', '-'),
+                                       ('sales_summary_order_update_old', 'UPDATE OF status, total_amount, created_at', 'OLD', '-'),
+                                       ('sales_summary_order_update_new', 'UPDATE OF status, total_amount, created_at', 'NEW', '+')):
+            c.execute(f'''CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON orders
+                          WHEN {row}.status != 'cancelled'
+                          BEGIN
+                              INSERT INTO sales_summary (bucket, key, order_count, revenue_cents)
+                              VALUES ('month', strftime('%Y-%m', {row}.created_at), {sign}1, {sign}{cents(row + '.total_amount')}),
+                                     ('week', strftime('%Y-W%W', {row}.created_at), {sign}1, {sign}{cents(row + '.total_amount')})
+                              ON CONFLICT (bucket, key) DO UPDATE SET
+                                  order_count = order_count + excluded.order_count,
+                                  revenue_cents = revenue_cents + excluded.revenue_cents;
+                          END''')
+        if not summary_exists:
+            c.execute(f'''INSERT INTO sales_summary (bucket, key, order_count, revenue_cents)
+                          SELECT 'month', strftime('%Y-%m', created_at), COUNT(*), SUM({cents('total_amount')})
+                          FROM orders WHERE status != 'cancelled' GROUP BY 1, 2
+                          UNION ALL
+                          SELECT 'week', strftime('%Y-W%W', created_at), COUNT(*), SUM({cents('total_amount')})
+                          FROM orders WHERE status != 'cancelled' GROUP BY 1, 2''')
+        
+        # Units sold and revenue per book from orders that are not cancelled, kept current
+        # by triggers so the top-seller and genre reports skip the order_items join
+        book_sales_exists = c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'book_sales'").fetchone()
+        c.execute('''CREATE TABLE IF NOT EXISTS book_sales (
+                        book_id INTEGER PRIMARY KEY,
+                        total_sold INTEGER NOT NULL DEFAULT 0,
+                        revenue_cents INTEGER NOT NULL DEFAULT 0
+                    )''')
+        order_lines = f'''SELECT book_id, {{sign}}SUM(quantity), {{sign}}SUM(quantity * {cents('price')}) FROM order_items
+                                  WHERE order_id = {{row}}.order_id GROUP BY book_id'''
+        for name, event, table, condition, sales in (
+                ('book_sales_item_insert', 'INSERT', 'order_items',
+                 "EXISTS (SELECT 1 FROM orders WHERE order_id = NEW.order_id AND status != 'cancelled')",
+                 f"VALUES (NEW.book_id, NEW.quantity, NEW.quantity * {cents('NEW.price')})"),
+                ('book_sales_item_delete', 'DELETE', 'order_items',
+                 "EXISTS (SELECT 1 FROM orders WHERE order_id = OLD.order_id AND status != 'cancelled')",
+                 f"VALUES (OLD.book_id, -OLD.quantity, -OLD.quantity * {cents('OLD.price')})"),
+                # An edited order line takes its old values out and puts its new ones in
+                ('book_sales_item_update_old', 'UPDATE OF order_id, book_id, quantity, price', 'order_items',
+                 "EXISTS (SELECT 1 FROM orders WHERE order_id = OLD.order_id AND status != 'cancelled')",
+                 f"VALUES (OLD.book_id, -OLD.quantity, -OLD.quantity * {cents('OLD.price')})"),
+                ('book_sales_item_update_new', 'UPDATE OF order_id, book_id, quantity, price', 'order_items',
+                 "EXISTS (SELECT 1 FROM orders WHERE order_id = NEW.order_id AND status != 'cancelled')",
+                 f"VALUES (NEW.book_id, NEW.quantity, NEW.quantity * {cents('NEW.price')})"),
+                ('book_sales_order_cancel', 'UPDATE OF status', 'orders',
+                 "OLD.status != 'cancelled' AND NEW.status = 'cancelled'", order_lines.format(sign='-', row='NEW')),
+                ('book_sales_order_uncancel', 'UPDATE OF status', 'orders',
+                 "OLD.status = 'cancelled' AND NEW.status != 'cancelled'", order_lines.format(sign='', row='NEW')),
+                ('book_sales_order_delete', 'DELETE', 'orders',
+                 "OLD.status != 'cancelled'", order_lines.format(sign='-', row='OLD'))):
+            c.execute(f'''CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON {table}
+                          WHEN {condition}
+                          BEGIN
+                              INSERT INTO book_sales (book_id, total_sold, revenue_cents)
+                              {sales}
+                              ON CONFLICT (book_id) DO UPDATE SET
+                                  total_sold = total_sold + excluded.total_sold,
+                                  revenue_cents = revenue_cents + excluded.revenue_cents;
+                          END''')
+        if not book_sales_exists:
+            c.execute(f'''INSERT INTO book_sales (book_id, total_sold, revenue_cents)
+                          SELECT oi.book_id, SUM(oi.quantity), SUM(oi.quantity * {cents('oi.price')})
+                          FROM order_items oi
+                          JOIN orders o ON oi.order_id = o.order_id
+                          WHERE o.status != 'cancelled'
+                          GROUP BY oi.book_id''')
+        
+        # A counter bumped by every write to the tables behind the admin dashboard, whichever
+        # app or process makes it, so cached aggregates can tell when they have gone stale
+        c.execute('''CREATE TABLE IF NOT EXISTS data_version (
+                        id INTEGER PRIMARY KEY CHECK (id = 1),
+                        version INTEGER NOT NULL
+                    )''')
+        c.execute('INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)')
+        for table in ('books', 'orders', 'order_items', 'notifications'):
+            for event in ('INSERT', 'UPDATE', 'DELETE'):
+                c.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_data_version_{event.lower()} AFTER {event} ON {table}
+                              BEGIN
+                                  UPDATE data_version SET version = version + 1 WHERE id = 1;
+                              END''')
+        
         # Create default admin if doesn't exist
         c.execute('SELECT COUNT(*) FROM admins')
         if c.fetchone()[0] == 0:
@@ -112,42 +357,84 @@ class Database:
                 ('Business Strategy 2024', 'MBA Expert', 'Latest business strategies for modern entrepreneurs and managers.', 35.99, 8, 'Business', 5)
             ]
             
-            for book in sample_books:
-                c.execute('''INSERT INTO books (title, author, description, price, stock, genre, stock_threshold)
-                            VALUES (?, ?, ?, ?, ?, ?, ?)''', book)
+            c.executemany('''INSERT INTO books (title, author, description, price, stock, genre, stock_threshold)
+                             VALUES (?, ?, ?, ?, ?, ?, ?)''', sample_books)
         
+        c.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
         conn.commit()
         conn.close()
     
-    def add_notification(self, notification_type, title, message):
-        """Add a new notification"""
-        conn = self.get_connection()
-        conn.execute('''INSERT INTO notifications (type, title, message) 
-                       VALUES (?, ?, ?)''', (notification_type, title, message))
-        conn.commit()
-        conn.close()
+    def add_notification(self, notification_type, title, message, conn=None):
+        """Add a new notification, inside the caller's transaction when a connection is given"""
+        sql = '''INSERT INTO notifications (type, title, message) 
+                 VALUES (?, ?, ?)'''
+        if conn is not None:
+            # Clearing the cached count before the caller commits would let a poll re-cache
+            # the old value, so the caller clears it after its commit instead
+            conn.execute(sql, (notification_type, title, message))
+            return
+        with self.writer.acquire() as conn:
+            conn.execute(sql, (notification_type, title, message))
+            conn.commit()
+        self.clear_notification_cache()
+    
+    @cache.memoize(timeout=60)
+    def get_in_stock_books(self, limit):
+        """The newest in-stock books for the home page"""
+        with self.reader.acquire() as conn:
+            books = conn.execute('''SELECT id, title, author, genre, price, stock, image_filename FROM books 
+                                    WHERE stock > 0 
+                                    ORDER BY created_at DESC
+                                    LIMIT ?''', (limit,)).fetchall()
+        return books
+    
+    @cache.memoize(timeout=300)
+    def get_filter_options(self):
+        """Genres and authors with books in stock, for the search filters"""
+        with self.reader.acquire() as conn:
+            genres = conn.execute('SELECT DISTINCT genre FROM books WHERE genre IS NOT NULL AND stock > 0').fetchall()
+            authors = conn.execute('SELECT DISTINCT author FROM books WHERE stock > 0').fetchall()
+        return genres, authors
+    
+    @cache.memoize(timeout=120)
+    def get_related_book_ids(self, genre, book_id):
+        """A random sample of up to four other in-stock books in the genre, kept briefly"""
+        with self.reader.acquire() as conn:
+            rows = conn.execute('''SELECT id FROM books 
+                                   WHERE genre = ? AND id != ? AND stock > 0 
+                                   ORDER BY RANDOM() 
+                                   LIMIT 4''', (genre, book_id)).fetchall()
+        return [row['id'] for row in rows]
+    
+    def clear_catalog_cache(self):
+        """Drop cached catalog reads after books or stock change"""
+        for method in (Database.get_in_stock_books, Database.get_filter_options, Database.get_related_book_ids):
+            cache.delete_memoized(method)
     
+    def clear_notification_cache(self):
+        """Drop the cached unread count after notifications change"""
+        cache.delete_memoized(Database.get_unread_notifications_count)
+    
+    @cache.memoize(timeout=30)
     def get_unread_notifications_count(self):
         """Get count of unread notifications"""
-        conn = self.get_connection()
-        count = conn.execute('SELECT COUNT(*) FROM notifications WHERE is_read = FALSE').fetchone()[0]
-        conn.close()
+        with self.reader.acquire() as conn:
+            count = conn.execute('SELECT COUNT(*) FROM notifications WHERE is_read = FALSE').fetchone()[0]
         return count
     
     def get_recent_notifications(self, limit=10):
         """Get recent notifications"""
-        conn = self.get_connection()
-        notifications = conn.execute('''
-            SELECT * FROM notifications 
-            ORDER BY created_at DESC 
-            LIMIT ?
-        ''', (limit,)).fetchall()
-        conn.close()
+        with self.reader.acquire() as conn:
+            notifications = conn.execute('''
+                SELECT * FROM notifications 
+                ORDER BY created_at DESC 
+                LIMIT ?
+            ''', (limit,)).fetchall()
         return notifications
     
     def mark_notification_read(self, notification_id):
         """Mark notification as read"""
-        conn = self.get_connection()
-        conn.execute('UPDATE notifications SET is_read = TRUE WHERE id = ?', (notification_id,))
-        conn.commit()
-        conn.close()
\ No newline at end of file
+        with self.writer.acquire() as conn:
+            conn.execute('UPDATE notifications SET is_read = TRUE WHERE id = ?', (notification_id,))
+            conn.commit()
+        self.clear_notification_cache()
\ No newline at end of file
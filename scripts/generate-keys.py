@@ -6,7 +6,7 @@ Generates AES-256 encryption keys and JWT secrets compatible with Node.js crypto
 
 import os
 import secrets
-import base64
+import shutil
 from typing import Tuple
 
 ENV_PATH = ".env"
@@ -23,7 +23,7 @@ def generate_jwt_secret(length: int = 64) -> str:
     Generate a secure JWT secret key.
     Returns base64url-encoded string for maximum compatibility.
     """
-    return base64.urlsafe_b64encode(secrets.token_bytes(length)).decode().rstrip('=')
+    return secrets.token_urlsafe(length)
 
 def read_env_file(env_path: str) -> dict:
     """Read existing .env file and parse key-value pairs."""
@@ -53,10 +53,28 @@ def write_keys_to_env(aes_key: str, jwt_secret: str, env_path: str = ENV_PATH) -
     existing_env['ENCRYPTION_KEY'] = aes_key
     existing_env['JWT_SECRET'] = jwt_secret
     
-    # Write back to file
-    with open(env_path, 'w', encoding='utf-8') as f:
-        for key, value in existing_env.items():
-            f.write(f"{key}={value}\n")
+    # Write the whole file to a sibling and rename it over the original, so an
+    # interrupted run never leaves a truncated .env behind
+    data = "".join(f"{key}={value}\n" for key, value in existing_env.items())
+    tmp_path = env_path + '.tmp'
+    # Created owner-only so the secrets are never readable by others, even briefly
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            if os.path.exists(env_path):
+                # Keep the original permissions, applied before any secret is written
+                shutil.copymode(env_path, tmp_path)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, env_path)
+    except BaseException:
+        # Don't leave a stray copy of the secrets next to the .env
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
 
 def validate_keys(aes_key: str, jwt_secret: str) -> list:
     """Validate generated keys meet security requirements."""
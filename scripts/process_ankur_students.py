@@ -6,10 +6,42 @@ Script to process Ankur student data from Excel file and add to MJV database
 import pandas as pd
 import requests
 import json
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+try:
+    import python_calamine
+    EXCEL_ENGINE = 'calamine'
+except ImportError:
+    # Without the Rust-backed calamine reader pandas falls back to openpyxl
+    EXCEL_ENGINE = None
 from datetime import datetime
 import sys
 import os
 
+# Students posted to the API at once
+UPLOAD_WORKERS = 16
+
+# Spreadsheet headers accepted for each student field, in order of preference
+COLUMN_ALIASES = {
+    'fullName': ('Name', 'নাম', 'Student Name'),
+    'fatherName': ('Father Name', 'বাপেকৰ নাম', "Father's Name"),
+    'motherName': ('Mother Name', 'মাকৰ নাম', "Mother's Name"),
+    'rollNumber': ('Roll No', 'Roll Number', 'ৰোল নং'),
+    'admissionNumber': ('Admission No', 'ভৰ্তি নং'),
+    'dateOfBirth': ('Date of Birth', 'জন্ম তাৰিখ', 'DOB'),
+    'gender': ('Gender', 'লিংগ', 'Sex'),
+    'category': ('Category', 'শ্ৰেণী'),
+    'religion': ('Religion', 'ধৰ্ম'),
+    'address': ('Address', 'ঠিকনা'),
+    'phoneNumber': ('Phone', 'ফোন', 'Contact'),
+    'bloodGroup': ('Blood Group', 'তেজৰ গ্ৰুপ'),
+    'emergencyContact': ('Emergency Contact', 'জৰুৰীকালীন যোগাযোগ'),
+}
+
+# Every header the import reads; other columns are skipped while parsing
+USED_COLUMNS = {alias for aliases in COLUMN_ALIASES.values() for alias in aliases}
+
 def process_ankur_excel():
     """Process the Ankur Excel file and extract student data"""
     try:
@@ -20,66 +52,69 @@ def process_ankur_excel():
         
         # Try to read the Excel file
         try:
-            df = pd.read_excel(excel_file)
+            df = pd.read_excel(excel_file, engine=EXCEL_ENGINE, usecols=lambda name: name in USED_COLUMNS)
         except Exception as e:
             print(f"Error reading Excel file: {e}")
             return None
             
         print(f"Found {len(df)} rows in the Excel file")
-        print(f"Columns: {list(df.columns)}")
+        print(f"Columns used: {list(df.columns)}")
         
         # Display first few rows to understand the structure
         print("\nFirst 5 rows:")
         print(df.head())
         
-        # Clean and process the data
-        students = []
+        # Resolve each field's header once, up front, keeping the first alias the sheet has
+        headers = {}
+        for field, aliases in COLUMN_ALIASES.items():
+            header = next((alias for alias in aliases if alias in df.columns), None)
+            if header is not None:
+                headers[header] = field
+        df = df[list(headers)].rename(columns=headers)
         
-        for index, row in df.iterrows():
-            try:
-                # Map Excel columns to our student schema
-                student_data = {
-                    'fullName': str(row.get('Name', row.get('নাম', row.get('Student Name', '')))).strip(),
-                    'fatherName': str(row.get('Father Name', row.get('বাপেকৰ নাম', row.get("Father's Name", '')))).strip(),
-                    'motherName': str(row.get('Mother Name', row.get('মাকৰ নাম', row.get("Mother's Name", '')))).strip(),
-                    'className': 'Ankur',  # All students in this file are Ankur class
-                    'stream': '',  # Pre-primary doesn't have streams
-                    'rollNumber': str(row.get('Roll No', row.get('Roll Number', row.get('ৰোল নং', index + 1)))),
-                    'admissionNumber': str(row.get('Admission No', row.get('ভৰ্তি নং', f'ANK{index + 1:03d}'))),
-                    'dateOfBirth': str(row.get('Date of Birth', row.get('জন্ম তাৰিখ', row.get('DOB', '2020-01-01')))),
-                    'gender': str(row.get('Gender', row.get('লিংগ', row.get('Sex', 'Male')))).strip().title(),
-                    'category': str(row.get('Category', row.get('শ্ৰেণী', 'General'))).strip(),
-                    'religion': str(row.get('Religion', row.get('ধৰ্ম', 'Hindu'))).strip(),
-                    'address': str(row.get('Address', row.get('ঠিকনা', 'Mahuramukh'))).strip(),
-                    'phoneNumber': str(row.get('Phone', row.get('ফোন', row.get('Contact', '')))).strip(),
-                    'admissionDate': '2025-04-01',  # Default admission date
-                    'academicYear': '2025-26',
-                    'status': 'active',
-                    'bloodGroup': str(row.get('Blood Group', row.get('তেজৰ গ্ৰুপ', ''))).strip(),
-                    'emergencyContact': str(row.get('Emergency Contact', row.get('জৰুৰীকালীন যোগাযোগ', ''))).strip(),
-                    'schoolId': 3  # MJV school ID
-                }
-                
-                # Clean empty strings and NaN values
-                for key, value in student_data.items():
-                    if pd.isna(value) or value == 'nan' or value == '':
-                        if key in ['fullName', 'fatherName', 'motherName']:
-                            student_data[key] = 'Unknown'
-                        elif key in ['rollNumber', 'admissionNumber']:
-                            student_data[key] = f'ANK{index + 1:03d}'
-                        else:
-                            student_data[key] = ''
-                
-                # Validate required fields
-                if student_data['fullName'] != 'Unknown' and student_data['fullName'].strip():
-                    students.append(student_data)
-                    print(f"Processed student: {student_data['fullName']}")
-                else:
-                    print(f"Skipping row {index + 1} - missing name")
-                    
-            except Exception as e:
-                print(f"Error processing row {index + 1}: {e}")
-                continue
+        # Clean and process the data column by column instead of row by row
+        serial = 'ANK' + (df.index + 1).astype(str).str.zfill(3)
+        
+        def column(field, missing=''):
+            """Stripped strings from a field's column, or `missing` when the sheet has none"""
+            if field not in df.columns:
+                return pd.Series(missing, index=df.index, dtype=object)
+            values = df[field].astype(object)
+            return values.where(values.notna(), '').astype(str).str.strip()
+        
+        def blank_to(values, fallback):
+            return values.mask(values == '', fallback)
+        
+        # Map Excel columns to our student schema
+        students = pd.DataFrame({
+            'fullName': blank_to(column('fullName'), 'Unknown'),
+            'fatherName': blank_to(column('fatherName'), 'Unknown'),
+            'motherName': blank_to(column('motherName'), 'Unknown'),
+            'className': 'Ankur',  # All students in this file are Ankur class
+            'stream': '',  # Pre-primary doesn't have streams
+            'rollNumber': blank_to(column('rollNumber', (df.index + 1).astype(str)), serial),
+            'admissionNumber': blank_to(column('admissionNumber', serial), serial),
+            'dateOfBirth': column('dateOfBirth', '2020-01-01'),
+            'gender': column('gender', 'Male').str.title(),
+            'category': column('category', 'General'),
+            'religion': column('religion', 'Hindu'),
+            'address': column('address', 'Mahuramukh'),
+            'phoneNumber': column('phoneNumber'),
+            'admissionDate': '2025-04-01',  # Default admission date
+            'academicYear': '2025-26',
+            'status': 'active',
+            'bloodGroup': column('bloodGroup'),
+            'emergencyContact': column('emergencyContact'),
+            'schoolId': 3  # MJV school ID
+        }, index=df.index)
+        
+        # Validate required fields
+        named = students['fullName'] != 'Unknown'
+        for index in students.index[~named]:
+            print(f"Skipping row {index + 1} - missing name")
+        students = students[named].to_dict(orient='records')
+        for student in students:
+            print(f"Processed student: {student['fullName']}")
         
         print(f"\nProcessed {len(students)} valid students")
         return students
@@ -95,16 +130,30 @@ def add_students_to_database(students):
         return
     
     base_url = "http://localhost:5000"
+    url = f"{base_url}/api/students"
     
-    for student in students:
-        try:
-            response = requests.post(f"{base_url}/api/students", json=student)
-            if response.status_code == 201:
-                print(f"✓ Added student: {student['fullName']}")
-            else:
-                print(f"✗ Failed to add {student['fullName']}: {response.text}")
-        except Exception as e:
-            print(f"✗ Error adding {student['fullName']}: {e}")
+    with requests.Session() as session:
+        # Keep one connection alive per worker rather than reconnecting for every student
+        adapter = HTTPAdapter(pool_maxsize=UPLOAD_WORKERS)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        
+        def post_student(student):
+            try:
+                return session.post(url, json=student)
+            except Exception as e:
+                return e
+        
+        with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+            responses = list(executor.map(post_student, students))
+    
+    for student, response in zip(students, responses):
+        if isinstance(response, Exception):
+            print(f"✗ Error adding {student['fullName']}: {response}")
+        elif response.status_code == 201:
+            print(f"✓ Added student: {student['fullName']}")
+        else:
+            print(f"✗ Failed to add {student['fullName']}: {response.text}")
 
 if __name__ == "__main__":
     print("Ankur Student Data Processor")
@@ -0,0 +1,117 @@
+import sqlite3
+
+import pytest
+
+from models.database import Database, cents
+
+# The rollups as the triggers should leave them, computed straight from the orders
+LIVE_BOOK_SALES = f'''SELECT oi.book_id, SUM(oi.quantity), SUM(oi.quantity * {cents('oi.price')})
+                      FROM order_items oi
+                      JOIN orders o ON oi.order_id = o.order_id
+                      WHERE o.status != 'cancelled'
+                      GROUP BY oi.book_id
+                      HAVING SUM(oi.quantity) != 0
+                      ORDER BY oi.book_id'''
+LIVE_SALES_SUMMARY = f'''SELECT 'month', strftime('%Y-%m', created_at), COUNT(*), SUM({cents('total_amount')})
+                         FROM orders WHERE status != 'cancelled' GROUP BY 1, 2
+                         UNION ALL
+                         SELECT 'week', strftime('%Y-W%W', created_at), COUNT(*), SUM({cents('total_amount')})
+                         FROM orders WHERE status != 'cancelled' GROUP BY 1, 2
+                         ORDER BY 1, 2'''
+
+@pytest.fixture
+def conn(tmp_path):
+    db_path = str(tmp_path / 'bookstore.db')
+    Database(db_path)
+    conn = sqlite3.connect(db_path)
+    yield conn
+    conn.close()
+
+def place_order(conn, order_id, lines, created_at='2026-03-04 10:00:00', status='pending'):
+    """Insert an order and its (book_id, quantity, price) lines"""
+    total = sum(quantity * price for _, quantity, price in lines)
+    with conn:
+        conn.execute('''INSERT INTO orders (order_id, customer_name, customer_email, total_amount, status, created_at)
+                        VALUES (?, 'Reader', 'reader@example.com', ?, ?, ?)''', (order_id, total, status, created_at))
+        conn.executemany('INSERT INTO order_items (order_id, book_id, quantity, price) VALUES (?, ?, ?, ?)',
+                         [(order_id, *line) for line in lines])
+
+def data_version(conn):
+    return conn.execute('SELECT version FROM data_version WHERE id = 1').fetchone()[0]
+
+def assert_rollups_match(conn):
+    book_sales = conn.execute('''SELECT book_id, total_sold, revenue_cents FROM book_sales
+                                 WHERE total_sold != 0 OR revenue_cents != 0 ORDER BY book_id''').fetchall()
+    assert book_sales == conn.execute(LIVE_BOOK_SALES).fetchall()
+    sales_summary = conn.execute('''SELECT bucket, key, order_count, revenue_cents FROM sales_summary
+                                    WHERE order_count != 0 OR revenue_cents != 0 ORDER BY bucket, key''').fetchall()
+    assert sales_summary == conn.execute(LIVE_SALES_SUMMARY).fetchall()
+
+def test_order_insert(conn):
+    place_order(conn, 'A', [(1, 2, 12.99), (3, 1, 14.99)])
+    place_order(conn, 'B', [(1, 1, 12.99)], created_at='2026-04-20 09:30:00')
+    assert_rollups_match(conn)
+    assert conn.execute('SELECT total_sold, revenue_cents FROM book_sales WHERE book_id = 1').fetchone() == (3, 3897)
+
+def test_cancelled_order_insert_is_not_counted(conn):
+    place_order(conn, 'A', [(1, 2, 12.99)], status='cancelled')
+    assert_rollups_match(conn)
+    assert conn.execute('SELECT COUNT(*) FROM book_sales WHERE total_sold != 0').fetchone()[0] == 0
+
+def test_cancel_and_uncancel(conn):
+    place_order(conn, 'A', [(1, 2, 12.99), (2, 1, 13.99)])
+    place_order(conn, 'B', [(2, 3, 13.99)])
+    with conn:
+        conn.execute("UPDATE orders SET status = 'cancelled' WHERE order_id = 'A'")
+    assert_rollups_match(conn)
+    with conn:
+        conn.execute("UPDATE orders SET status = 'shipped' WHERE order_id = 'A'")
+    assert_rollups_match(conn)
+
+def test_order_delete(conn):
+    place_order(conn, 'A', [(1, 2, 12.99)])
+    place_order(conn, 'B', [(1, 1, 12.99)], status='cancelled')
+    with conn:
+        conn.execute("DELETE FROM orders WHERE order_id IN ('A', 'B')")
+    assert_rollups_match(conn)
+
+def test_line_item_edit_and_delete(conn):
+    place_order(conn, 'A', [(1, 2, 12.99), (2, 1, 13.99)])
+    place_order(conn, 'B', [(3, 1, 14.99)], status='cancelled')
+    with conn:
+        conn.execute("UPDATE order_items SET quantity = 5, price = 9.5 WHERE order_id = 'A' AND book_id = 1")
+    assert_rollups_match(conn)
+    with conn:
+        conn.execute("UPDATE order_items SET book_id = 4 WHERE order_id = 'A' AND book_id = 2")
+    assert_rollups_match(conn)
+    with conn:
+        # Moving a line out of a cancelled order into a live one starts counting it
+        conn.execute("UPDATE order_items SET order_id = 'A' WHERE order_id = 'B'")
+    assert_rollups_match(conn)
+    with conn:
+        conn.execute("DELETE FROM order_items WHERE order_id = 'A' AND book_id = 4")
+    assert_rollups_match(conn)
+
+def test_backfill_from_existing_orders(conn, tmp_path):
+    place_order(conn, 'A', [(1, 2, 12.99), (3, 1, 14.99)])
+    place_order(conn, 'B', [(2, 1, 13.99)], status='cancelled')
+    with conn:
+        conn.execute('DROP TABLE book_sales')
+        conn.execute('DROP TABLE sales_summary')
+        conn.execute('PRAGMA user_version = 0')
+    Database(str(tmp_path / 'bookstore.db'))
+    assert_rollups_match(conn)
+
+def test_data_version_moves_on_every_write(conn):
+    version = data_version(conn)
+    place_order(conn, 'A', [(1, 1, 12.99)])
+    assert data_version(conn) > version
+    for statement in ("UPDATE orders SET status = 'shipped' WHERE order_id = 'A'",
+                      "UPDATE order_items SET quantity = 2 WHERE order_id = 'A'",
+                      'UPDATE books SET stock = stock - 1 WHERE id = 1',
+                      "INSERT INTO notifications (type, title, message) VALUES ('t', 't', 'm')",
+                      "DELETE FROM orders WHERE order_id = 'A'"):
+        version = data_version(conn)
+        with conn:
+            conn.execute(statement)
+        assert data_version(conn) > version, statement
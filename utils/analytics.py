@@ -1,188 +1,210 @@
-import sqlite3
 from datetime import datetime, timedelta
 
+from models.database import get_pool
+from utils.cache import cache
+
+# Writes through this app clear the aggregates right away; the timeout bounds how
+# stale they get after orders written by app.py, which shares the database file
+ANALYTICS_CACHE_TIMEOUT = 30
+
+# One book_sales row per book, so the export reads no order items and, unlike a
+# LEFT JOIN of orders filtered on status, leaves cancelled orders out of the totals
+BOOKS_EXPORT_SQL = '''
+    SELECT 
+        b.id, b.title, b.author, b.genre, b.price, b.stock, b.stock_threshold,
+        COALESCE(s.total_sold, 0) as total_sold,
+        COALESCE(s.revenue_cents / 100.0, 0) as total_revenue
+    FROM books b
+    LEFT JOIN book_sales s ON s.book_id = b.id
+    ORDER BY total_revenue DESC, b.id
+'''
+
+# Rows fetched and written per chunk of the streaming CSV export
+EXPORT_BATCH_SIZE = 500
+
+# Every dashboard figure from one statement, scanning books and orders once each
+DASHBOARD_STATS_SQL = '''
+    WITH book_stats AS (
+        SELECT COUNT(*) as total_books,
+               COALESCE(SUM(stock), 0) as total_stock,
+               COALESCE(SUM(stock <= stock_threshold), 0) as low_stock_books,
+               COALESCE(SUM(stock = 0), 0) as out_of_stock
+        FROM books
+    ),
+    order_stats AS (
+        SELECT COUNT(*) as total_orders,
+               COALESCE(SUM(status = 'pending'), 0) as pending_orders,
+               COALESCE(SUM(CASE WHEN status != 'cancelled' THEN total_amount END), 0) as total_revenue
+        FROM orders
+    ),
+    -- A half-open range on created_at, unlike date(created_at), can seek idx_orders_created
+    today_stats AS (
+        SELECT COUNT(*) as today_orders,
+               COALESCE(SUM(CASE WHEN status != 'cancelled' THEN total_amount END), 0) as today_revenue
+        FROM orders
+        WHERE created_at >= date('now') AND created_at < date('now', '+1 day')
+    )
+    SELECT * FROM book_stats, order_stats, today_stats
+'''
+
 class Analytics:
     def __init__(self, db_path='bookstore.db'):
         self.db_path = db_path
+        self.reader = get_pool(db_path, readonly=True)
     
-    def get_connection(self):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+    def clear_cache(self):
+        """Drop cached aggregates so the next read reflects new writes"""
+        for method in (Analytics.get_dashboard_stats, Analytics.get_top_selling_books,
+                       Analytics.get_low_stock_alerts, Analytics.get_sales_by_genre,
+                       Analytics.get_monthly_sales_data, Analytics.get_weekly_order_trends):
+            cache.delete_memoized(method)
     
+    @cache.memoize(timeout=ANALYTICS_CACHE_TIMEOUT)
     def get_dashboard_stats(self):
         """Get comprehensive dashboard statistics"""
-        conn = self.get_connection()
-        
-        # Basic stats
-        total_books = conn.execute('SELECT COUNT(*) as count FROM books').fetchone()['count']
-        total_stock = conn.execute('SELECT SUM(stock) as total FROM books').fetchone()['total'] or 0
-        low_stock_books = conn.execute('SELECT COUNT(*) as count FROM books WHERE stock <= stock_threshold').fetchone()['count']
-        out_of_stock = conn.execute('SELECT COUNT(*) as count FROM books WHERE stock = 0').fetchone()['count']
-        
-        # Order stats
-        total_orders = conn.execute('SELECT COUNT(*) as count FROM orders').fetchone()['count']
-        pending_orders = conn.execute('SELECT COUNT(*) as count FROM orders WHERE status = "pending"').fetchone()['count']
-        today_orders = conn.execute('SELECT COUNT(*) as count FROM orders WHERE date(created_at) = date("now")').fetchone()['count']
-        
-        # Revenue stats
-        total_revenue = conn.execute('SELECT SUM(total_amount) as revenue FROM orders WHERE status != "cancelled"').fetchone()['revenue'] or 0
-        today_revenue = conn.execute('SELECT SUM(total_amount) as revenue FROM orders WHERE date(created_at) = date("now") AND status != "cancelled"').fetchone()['revenue'] or 0
-        
-        conn.close()
+        with self.reader.acquire() as conn:
+            stats = conn.execute(DASHBOARD_STATS_SQL).fetchone()
         
         return {
-            'total_books': total_books,
-            'total_stock': total_stock,
-            'low_stock_books': low_stock_books,
-            'out_of_stock': out_of_stock,
-            'total_orders': total_orders,
-            'pending_orders': pending_orders,
-            'today_orders': today_orders,
-            'total_revenue': round(total_revenue, 2),
-            'today_revenue': round(today_revenue, 2)
+            'total_books': stats['total_books'],
+            'total_stock': stats['total_stock'],
+            'low_stock_books': stats['low_stock_books'],
+            'out_of_stock': stats['out_of_stock'],
+            'total_orders': stats['total_orders'],
+            'pending_orders': stats['pending_orders'],
+            'today_orders': stats['today_orders'],
+            'total_revenue': round(stats['total_revenue'], 2),
+            'today_revenue': round(stats['today_revenue'], 2)
         }
     
+    @cache.memoize(timeout=ANALYTICS_CACHE_TIMEOUT)
     def get_top_selling_books(self, limit=5):
         """Get top selling books"""
-        conn = self.get_connection()
-        top_books = conn.execute('''
-            SELECT b.id, b.title, b.author, b.price, b.stock,
-                   SUM(oi.quantity) as total_sold,
-                   SUM(oi.quantity * oi.price) as total_revenue
-            FROM books b
-            JOIN order_items oi ON b.id = oi.book_id
-            JOIN orders o ON oi.order_id = o.order_id
-            WHERE o.status != 'cancelled'
-            GROUP BY b.id
-            ORDER BY total_sold DESC
-            LIMIT ?
-        ''', (limit,)).fetchall()
-        conn.close()
+        with self.reader.acquire() as conn:
+            top_books = conn.execute('''
+                SELECT b.id, b.title, b.author, b.price, b.stock,
+                       s.total_sold, s.revenue_cents / 100.0 as total_revenue
+                FROM book_sales s
+                JOIN books b ON b.id = s.book_id
+                WHERE s.total_sold > 0
+                ORDER BY s.total_sold DESC, s.book_id
+                LIMIT ?
+            ''', (limit,)).fetchall()
         return top_books
     
+    @cache.memoize(timeout=ANALYTICS_CACHE_TIMEOUT)
     def get_low_stock_alerts(self):
         """Get books with low stock"""
-        conn = self.get_connection()
-        low_stock = conn.execute('''
-            SELECT * FROM books 
-            WHERE stock <= stock_threshold AND stock > 0
-            ORDER BY stock ASC
-        ''').fetchall()
-        conn.close()
+        with self.reader.acquire() as conn:
+            low_stock = conn.execute('''
+                SELECT * FROM books 
+                WHERE stock <= stock_threshold AND stock > 0
+                ORDER BY stock ASC
+            ''').fetchall()
         return low_stock
     
     def get_out_of_stock_books(self):
         """Get out of stock books"""
-        conn = self.get_connection()
-        out_of_stock = conn.execute('''
-            SELECT * FROM books 
-            WHERE stock = 0
-            ORDER BY title
-        ''').fetchall()
-        conn.close()
+        with self.reader.acquire() as conn:
+            out_of_stock = conn.execute('''
+                SELECT * FROM books 
+                WHERE stock = 0
+                ORDER BY title
+            ''').fetchall()
         return out_of_stock
     
     def get_recent_orders(self, limit=10):
         """Get recent orders with details"""
-        conn = self.get_connection()
-        recent_orders = conn.execute('''
-            SELECT o.*, COUNT(oi.id) as item_count,
-                   GROUP_CONCAT(b.title, ', ') as book_titles
-            FROM orders o
-            LEFT JOIN order_items oi ON o.order_id = oi.order_id
-            LEFT JOIN books b ON oi.book_id = b.id
-            GROUP BY o.id
-            ORDER BY o.created_at DESC
-            LIMIT ?
-        ''', (limit,)).fetchall()
-        conn.close()
+        with self.reader.acquire() as conn:
+            # Page the orders first so the item lookups only run for the rows returned
+            recent_orders = conn.execute('''
+                SELECT o.*,
+                       (SELECT COUNT(*) FROM order_items oi WHERE oi.order_id = o.order_id) as item_count,
+                       (SELECT GROUP_CONCAT(b.title, ', ')
+                        FROM order_items oi JOIN books b ON oi.book_id = b.id
+                        WHERE oi.order_id = o.order_id) as book_titles
+                FROM orders o
+                ORDER BY o.created_at DESC
+                LIMIT ?
+            ''', (limit,)).fetchall()
         return recent_orders
     
+    @cache.memoize(timeout=ANALYTICS_CACHE_TIMEOUT)
     def get_sales_by_genre(self):
         """Get sales data by genre"""
-        conn = self.get_connection()
-        genre_sales = conn.execute('''
-            SELECT b.genre, 
-                   SUM(oi.quantity) as total_sold,
-                   SUM(oi.quantity * oi.price) as total_revenue,
-                   COUNT(DISTINCT b.id) as book_count
-            FROM books b
-            JOIN order_items oi ON b.id = oi.book_id
-            JOIN orders o ON oi.order_id = o.order_id
-            WHERE o.status != 'cancelled' AND b.genre IS NOT NULL
-            GROUP BY b.genre
-            ORDER BY total_revenue DESC
-        ''').fetchall()
-        conn.close()
+        with self.reader.acquire() as conn:
+            genre_sales = conn.execute('''
+                SELECT b.genre, 
+                       SUM(s.total_sold) as total_sold,
+                       SUM(s.revenue_cents) / 100.0 as total_revenue,
+                       COUNT(*) as book_count
+                FROM book_sales s
+                JOIN books b ON b.id = s.book_id
+                WHERE s.total_sold > 0 AND b.genre IS NOT NULL
+                GROUP BY b.genre
+                ORDER BY total_revenue DESC
+            ''').fetchall()
         return genre_sales
     
+    @cache.memoize(timeout=ANALYTICS_CACHE_TIMEOUT)
     def get_monthly_sales_data(self, months=6):
         """Get monthly sales data for chart"""
-        conn = self.get_connection()
-        monthly_data = conn.execute('''
-            SELECT 
-                strftime('%Y-%m', created_at) as month,
-                COUNT(*) as order_count,
-                SUM(total_amount) as revenue
-            FROM orders 
-            WHERE created_at >= date('now', '-{} months')
-            AND status != 'cancelled'
-            GROUP BY strftime('%Y-%m', created_at)
-            ORDER BY month
-        '''.format(months)).fetchall()
-        conn.close()
+        with self.reader.acquire() as conn:
+            monthly_data = conn.execute('''
+                SELECT key as month, order_count, revenue_cents / 100.0 as revenue
+                FROM sales_summary
+                WHERE bucket = 'month' AND key >= strftime('%Y-%m', 'now', ?)
+                AND order_count > 0
+                ORDER BY key
+            ''', (f'-{int(months)} months',)).fetchall()
         return monthly_data
     
+    @cache.memoize(timeout=ANALYTICS_CACHE_TIMEOUT)
     def get_weekly_order_trends(self, weeks=8):
         """Get weekly order trends"""
-        conn = self.get_connection()
-        weekly_data = conn.execute('''
-            SELECT 
-                strftime('%Y-W%W', created_at) as week,
-                COUNT(*) as order_count,
-                SUM(total_amount) as revenue
-            FROM orders 
-            WHERE created_at >= date('now', '-{} days')
-            AND status != 'cancelled'
-            GROUP BY strftime('%Y-W%W', created_at)
-            ORDER BY week
-        '''.format(weeks * 7)).fetchall()
-        conn.close()
+        with self.reader.acquire() as conn:
+            weekly_data = conn.execute('''
+                SELECT key as week, order_count, revenue_cents / 100.0 as revenue
+                FROM sales_summary
+                WHERE bucket = 'week' AND key >= strftime('%Y-W%W', 'now', ?)
+                AND order_count > 0
+                ORDER BY key
+            ''', (f'-{int(weeks) * 7} days',)).fetchall()
         return weekly_data
     
     def export_analytics_data(self):
         """Export analytics data for CSV"""
-        conn = self.get_connection()
+        with self.reader.acquire() as conn:
+            # Books with sales data
+            books_data = conn.execute(BOOKS_EXPORT_SQL).fetchall()
         
-        # Books with sales data
-        books_data = conn.execute('''
-            SELECT 
-                b.id, b.title, b.author, b.genre, b.price, b.stock,
-                COALESCE(SUM(oi.quantity), 0) as total_sold,
-                COALESCE(SUM(oi.quantity * oi.price), 0) as total_revenue
-            FROM books b
-            LEFT JOIN order_items oi ON b.id = oi.book_id
-            LEFT JOIN orders o ON oi.order_id = o.order_id AND o.status != 'cancelled'
-            GROUP BY b.id
-            ORDER BY total_revenue DESC
-        ''').fetchall()
+            # Orders data
+            orders_data = conn.execute('''
+                SELECT 
+                    o.order_id, o.customer_name, o.customer_email, 
+                    o.total_amount, o.status, o.created_at,
+                    COUNT(oi.id) as item_count
+                FROM orders o
+                LEFT JOIN order_items oi ON o.order_id = oi.order_id
+                GROUP BY o.id
+                ORDER BY o.created_at DESC
+            ''').fetchall()
         
-        # Orders data
-        orders_data = conn.execute('''
-            SELECT 
-                o.order_id, o.customer_name, o.customer_email, 
-                o.total_amount, o.status, o.created_at,
-                COUNT(oi.id) as item_count
-            FROM orders o
-            LEFT JOIN order_items oi ON o.order_id = oi.order_id
-            GROUP BY o.id
-            ORDER BY o.created_at DESC
-        ''').fetchall()
-        
-        conn.close()
         
         return {
             'books': books_data,
             'orders': orders_data
-        }
\ No newline at end of file
+        }
+    
+    def iter_books_export(self, batch_size=EXPORT_BATCH_SIZE):
+        """Yield books with sales data in batches of plain tuples for streaming exports"""
+        with self.reader.acquire() as conn:
+            cursor = conn.cursor()
+            # Tuples in BOOKS_EXPORT_SQL's column order are all a CSV writer needs
+            cursor.row_factory = None
+            cursor.execute(BOOKS_EXPORT_SQL)
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    return
+                yield batch
\ No newline at end of file
@@ -0,0 +1,26 @@
+import hashlib
+import hmac
+import os
+
+from werkzeug.security import check_password_hash
+
+from utils.cache import TTLCache
+
+VERIFIED_LOGIN_TIMEOUT = 15 * 60
+
+# Keyed with a per-process secret so the cache never holds anything that can be
+# checked against a password offline
+_VERIFIED_LOGIN_KEY = os.urandom(32)
+_verified_logins = TTLCache(default_timeout=VERIFIED_LOGIN_TIMEOUT)
+
+def check_password_cached(username, password_hash, password):
+    """check_password_hash that skips the KDF for a recently verified correct password"""
+    digest = hmac.new(_VERIFIED_LOGIN_KEY, password.encode('utf-8'), hashlib.sha256).digest()
+    # The stored hash is part of the key, so changing a password invalidates the entry
+    key = (username, password_hash, digest)
+    if _verified_logins.get(key):
+        return True
+    if check_password_hash(password_hash, password):
+        _verified_logins.set(key, True)
+        return True
+    return False
@@ -0,0 +1,84 @@
+import threading
+import time
+from functools import wraps
+
+_MISSING = object()
+
+class TTLCache:
+    """Small thread-safe in-process cache with per-entry expiry"""
+
+    def __init__(self, default_timeout=60):
+        self.default_timeout = default_timeout
+        self._data = {}
+        self._lock = threading.Lock()
+        self._next_sweep = time.monotonic() + default_timeout
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key, value, timeout=None):
+        if timeout is None:
+            timeout = self.default_timeout
+        with self._lock:
+            now = time.monotonic()
+            self._data[key] = (value, now + timeout)
+            # Entries are otherwise only dropped when read, so keys that are never
+            # asked for again would pile up; clear them out once per default timeout
+            if now >= self._next_sweep:
+                self._next_sweep = now + self.default_timeout
+                for k in [k for k, (_, expires_at) in self._data.items() if expires_at < now]:
+                    del self._data[k]
+
+    def incr(self, key, timeout=None):
+        """Atomically add one to a counter, starting it at 1 with a fresh expiry if it is missing or expired"""
+        if timeout is None:
+            timeout = self.default_timeout
+        with self._lock:
+            now = time.monotonic()
+            entry = self._data.get(key)
+            if entry is None or entry[1] < now:
+                entry = (0, now + timeout)
+            # Keeps the expiry it started with, so the counter covers one fixed window
+            value = entry[0] + 1
+            self._data[key] = (value, entry[1])
+            return value
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def memoize(self, timeout=None):
+        """Cache a function's return value keyed by the function and its arguments"""
+        def decorator(f):
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                key = (f.__qualname__, args, tuple(sorted(kwargs.items())))
+                value = self.get(key, _MISSING)
+                if value is _MISSING:
+                    value = f(*args, **kwargs)
+                    self.set(key, value, timeout)
+                return value
+            return wrapper
+        return decorator
+
+    def delete_memoized(self, f):
+        """Drop every cached result of a memoized function"""
+        name = f.__qualname__
+        with self._lock:
+            for key in [k for k in self._data if isinstance(k, tuple) and k[0] == name]:
+                del self._data[key]
+
+# Shared cache for aggregate queries used by the admin dashboard
+cache = TTLCache(default_timeout=60)
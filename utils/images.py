@@ -0,0 +1,63 @@
+import os
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    # Without Pillow uploads are stored and served as they were sent
+    Image = None
+
+COVER_SIZE = (800, 800)
+THUMBNAIL_SIZE = (300, 300)
+WEBP_QUALITY = 82
+
+_COVER_SUFFIX = '_cover.webp'
+_THUMBNAIL_SUFFIX = '_thumb.webp'
+
+def thumbnail_name(filename):
+    """Filename of a cover's list-page thumbnail, or the cover itself if it was never converted"""
+    if filename and filename.endswith(_COVER_SUFFIX):
+        return filename[:-len(_COVER_SUFFIX)] + _THUMBNAIL_SUFFIX
+    return filename
+
+def cover_files(filename):
+    """Every file stored on disk for a cover"""
+    thumbnail = thumbnail_name(filename)
+    return [filename] if thumbnail == filename else [filename, thumbnail]
+
+def remove_upload(path):
+    """Delete an uploaded file, ignoring one that is already gone"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def remove_cover(folder, filename):
+    """Delete a cover and its thumbnail from the upload folder"""
+    for name in cover_files(filename):
+        remove_upload(os.path.join(folder, name))
+
+def optimize_cover(path):
+    """Replace an uploaded cover with downscaled WebP cover and thumbnail files, returning the cover's filename"""
+    if Image is None:
+        return os.path.basename(path)
+
+    stem = os.path.splitext(path)[0]
+    cover_path = stem + _COVER_SUFFIX
+    thumbnail_path = stem + _THUMBNAIL_SUFFIX
+    try:
+        with Image.open(path) as original:
+            img = ImageOps.exif_transpose(original)
+            if img.mode not in ('RGB', 'RGBA'):
+                img = img.convert('RGBA' if 'transparency' in img.info or img.mode in ('LA', 'PA') else 'RGB')
+            img.thumbnail(COVER_SIZE)
+            img.save(cover_path, 'WEBP', quality=WEBP_QUALITY, method=6)
+            img.thumbnail(THUMBNAIL_SIZE)
+            img.save(thumbnail_path, 'WEBP', quality=WEBP_QUALITY, method=6)
+    except (OSError, Image.DecompressionBombError):
+        # Not something Pillow can re-encode; keep serving the original
+        for leftover in (cover_path, thumbnail_path):
+            remove_upload(leftover)
+        return os.path.basename(path)
+
+    os.remove(path)
+    return os.path.basename(cover_path)